@@ -0,0 +1,74 @@
+"""
+Benchmark the async geocoding pipeline against the local stub geocoding server.
+
+Geocodes a synthetic practice list with batch_geocode, with the stub answering after a fixed
+latency and injecting errors at the given rates, and reports throughput and outcomes. Needs no
+network or API key.
+
+Usage:
+    uv run python devtools/bench_geocode.py [--practices N] [--concurrent N] [--latency S]
+        [--rate R] [--qps-limit R] [--error-rate P] [--quota-rate P] [--not-found-rate P]
+"""
+
+import argparse
+import time
+
+from QOF_visualisation.batch_geocode import batch_geocode
+from QOF_visualisation.coord_dataclasses import PracticeAdd
+from QOF_visualisation.geocode_stub import GeocodeStubServer, StubConfig
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--practices", type=int, default=1000)
+    parser.add_argument("--concurrent", type=int, default=10)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--qps-limit", type=float, default=None)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-rate", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    practices = [
+        PracticeAdd(f"P{i:05d}", f"Practice {i}, AB{i % 99} {i % 9}CD", f"Practice {i}, long {i}")
+        for i in range(args.practices)
+    ]
+    config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        not_found_rate=args.not_found_rate,
+        quota_rate=args.quota_rate,
+        error_rate=args.error_rate,
+        qps_limit=args.qps_limit,
+        seed=args.seed,
+    )
+
+    with GeocodeStubServer(config) as server:
+        start = time.perf_counter()
+        located, failed = batch_geocode(
+            practices,
+            "",
+            concurrent=args.concurrent,
+            retries=args.retries,
+            geocoder=server.geocoder(),
+            rate=args.rate,
+        )
+        elapsed = time.perf_counter() - start
+    stats = server.stats()
+
+    print(f"Geocoded {len(practices)} practices in {elapsed:.2f}s")
+    print(f"  located {len(located)}, failed {len(failed)}")
+    print(f"  {stats.requests} requests, {stats.requests / elapsed:.1f} req/s")
+    print(
+        f"  stub answered {stats.ok} OK, {stats.not_found} ZERO_RESULTS, "
+        f"{stats.over_query_limit} OVER_QUERY_LIMIT, {stats.errors} errors; "
+        f"max in flight {stats.max_in_flight}"
+    )
+
+
+if __name__ == "__main__":
+    main()
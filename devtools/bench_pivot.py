@@ -0,0 +1,139 @@
+"""
+Benchmark the ways of pivoting the long QOF achievement data to one row per
+practice, indicator and year.
+
+Reads the hive-partitioned achievement dataset written by get_sources. If it has
+not been downloaded, a synthetic dataset of the same shape (five years, ~6,500
+practices, ~75 indicators, four measures) is generated instead.
+
+Usage:
+    uv run python devtools/bench_pivot.py [achievement_dir] [--repeat N]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import duckdb
+
+DEFAULT_DATASET = Path("src/QOF_visualisation/sources/achievement")
+
+MEASURES = ("NUMERATOR", "DENOMINATOR", "REGISTER", "ACHIEVED_POINTS")
+
+CASE_GROUP_BY_ALL = """
+    select
+        practice_code,
+        indicator_code,
+        max(case when measure = 'NUMERATOR' then value end) as numerator,
+        max(case when measure = 'DENOMINATOR' then value end) as denominator,
+        max(case when measure = 'REGISTER' then value end) as register,
+        max(case when measure = 'ACHIEVED_POINTS' then value end) as achieved_points,
+        reporting_year
+    from achievement
+    group by all
+"""
+
+FILTER_NARROW_KEY = """
+    select
+        practice_code,
+        indicator_code,
+        max(value) filter (where measure = 'NUMERATOR') as numerator,
+        max(value) filter (where measure = 'DENOMINATOR') as denominator,
+        max(value) filter (where measure = 'REGISTER') as register,
+        max(value) filter (where measure = 'ACHIEVED_POINTS') as achieved_points,
+        reporting_year
+    from achievement
+    group by practice_code, indicator_code, reporting_year
+"""
+
+NATIVE_PIVOT = f"""
+    pivot achievement
+    on measure in ({", ".join(f"'{m}'" for m in MEASURES)})
+    using max(value)
+    group by practice_code, indicator_code, reporting_year
+"""
+
+QUERIES = {
+    "max(case) / group by all": CASE_GROUP_BY_ALL,
+    "filter / narrow key": FILTER_NARROW_KEY,
+    "native pivot": NATIVE_PIVOT,
+}
+
+
+def generate_dataset(target: Path) -> None:
+    """Write a synthetic achievement dataset with the shape of five QOF years."""
+    print("No achievement dataset found, generating a synthetic one.")
+    conn = duckdb.connect()
+    conn.sql(f"""
+        copy (
+            select
+                'P' || lpad(p::varchar, 5, '0') as PRACTICE_CODE,
+                'IND' || lpad(i::varchar, 3, '0') as INDICATOR_CODE,
+                m as MEASURE,
+                round(random() * 1000, 0)::double as "VALUE",
+                y as reporting_year
+            from
+                range(6500) as t1(p),
+                range(75) as t2(i),
+                unnest({list(MEASURES)}) as t3(m),
+                range(2020, 2025) as t4(y)
+        ) to '{target}' (format parquet, partition_by (reporting_year))
+    """)
+    conn.close()
+
+
+def load(conn: duckdb.DuckDBPyConnection, dataset: Path) -> int:
+    """Materialize the dataset in memory so that only the pivot is timed."""
+    conn.sql(f"""
+        create table achievement as
+        select
+            PRACTICE_CODE as practice_code,
+            INDICATOR_CODE as indicator_code,
+            MEASURE as measure,
+            "VALUE" as value,
+            reporting_year
+        from read_parquet('{dataset}/*/*.parquet', hive_partitioning = true)
+    """)
+    return conn.sql("select count(*) from achievement").fetchone()[0]  # type: ignore[index]
+
+
+def time_query(conn: duckdb.DuckDBPyConnection, query: str, repeat: int) -> tuple[float, int]:
+    """Return the median time of materializing a query and its row count."""
+    timings: list[float] = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.sql(f"create or replace temp table result as {query}")
+        timings.append(time.perf_counter() - start)
+        rows = conn.sql("select count(*) from result").fetchone()[0]  # type: ignore[index]
+    return statistics.median(timings), rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dataset", nargs="?", type=Path, default=DEFAULT_DATASET)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dataset: Path = args.dataset
+        if not any(dataset.glob("*/*.parquet")):
+            dataset = Path(tmpdir) / "achievement"
+            generate_dataset(dataset)
+
+        conn = duckdb.connect()
+        n_rows = load(conn, dataset)
+        print(f"Pivoting {n_rows:,} rows, median of {args.repeat} runs\n")
+
+        baseline: float | None = None
+        for name, query in QUERIES.items():
+            elapsed, rows = time_query(conn, query, args.repeat)
+            baseline = baseline or elapsed
+            print(f"{name:<28} {elapsed:8.3f}s  {rows:>10,} rows  x{baseline / elapsed:.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,35 @@
-with practice_metadata as (
+{{
+  config(
+    materialized = 'incremental',
+    incremental_strategy = 'delete+insert',
+    unique_key = 'reporting_year'
+  )
+}}
+
+-- Incremental by reporting year, following int__percent_achieved: only years
+-- whose source hash differs from the one last processed here, or that have no
+-- hash because they were built without a manifest entry, are rebuilt.
+-- Run with --full-refresh after changes to practice metadata or locations.
+
+with percent_achieved as (
+    select *
+    from
+        {{ ref('int__percent_achieved') }}
+    {% if is_incremental() %}
+    where
+        reporting_year in (
+            select distinct achieved.reporting_year
+            from {{ ref('int__percent_achieved') }} as achieved
+            left join (select distinct reporting_year, source_sha256 from {{ this }}) as processed
+                on achieved.reporting_year = processed.reporting_year
+            where
+                processed.source_sha256 is distinct from achieved.source_sha256
+                or achieved.source_sha256 is null
+        )
+    {% endif %}
+),
+
+practice_metadata as (
     select
         practice_code,
         practice_name,
@@ -65,9 +96,10 @@ select
     percent_achieved.patient_list_type,
     percent_achieved.percentage_patients_achieved,
     percent_achieved.percentage_points_achieved,
-    percent_achieved.reporting_year
+    percent_achieved.reporting_year,
+    percent_achieved.source_sha256
 from
-    {{ ref('int__percent_achieved') }} as percent_achieved
+    percent_achieved
 left join
     practice_metadata
     on
@@ -1,16 +1,54 @@
-with pivoted as (
+{{
+  config(
+    materialized = 'incremental',
+    incremental_strategy = 'delete+insert',
+    unique_key = 'reporting_year'
+  )
+}}
+
+-- Incremental by reporting year: each run rebuilds only the years whose source
+-- archive hash in the achievement manifest differs from the hash last processed.
+-- A full build takes every year in the source data, whether or not it is in the
+-- manifest; years without a hash are rebuilt by the next incremental run that has one.
+-- Run with --full-refresh after changes to the reference set or indicator logic.
+
+with manifest as (
+    select
+        reporting_year,
+        source_sha256
+    from
+        {{ ref('stg_qof__achievement_manifest') }}
+),
+
+{% if is_incremental() %}
+changed_years as (
+    select manifest.reporting_year
+    from manifest
+    left join (select distinct reporting_year, source_sha256 from {{ this }}) as processed
+        on manifest.reporting_year = processed.reporting_year
+    where processed.source_sha256 is distinct from manifest.source_sha256
+),
+{% endif %}
+
+pivoted as (
     select
         practice_code,
         indicator_code,
-        max(case when measure = 'NUMERATOR' then value end) as numerator,
-        max(case when measure = 'DENOMINATOR' then value end) as denominator,
-        max(case when measure = 'REGISTER' then value end) as register,
-        max(case when measure = 'ACHIEVED_POINTS' then value end) as achieved_points,
+        max(value) filter (where measure = 'NUMERATOR') as numerator,
+        max(value) filter (where measure = 'DENOMINATOR') as denominator,
+        max(value) filter (where measure = 'REGISTER') as register,
+        max(value) filter (where measure = 'ACHIEVED_POINTS') as achieved_points,
         reporting_year
     from
-        {{ ref('int_union__qof_achievement') }}
+        {{ ref('stg_qof__achievement') }}
+    {% if is_incremental() %}
+    where
+        reporting_year in (select reporting_year from changed_years)
+    {% endif %}
     group by
-        all
+        practice_code,
+        indicator_code,
+        reporting_year
 ),
 
 indicators as (
@@ -63,8 +101,11 @@ select
         when pivoted.achieved_points is not null and indicators.indicator_point_value is not null and indicators.indicator_point_value != 0
             then (pivoted.achieved_points * 100 / indicators.indicator_point_value)
     end as percentage_points_achieved,
-    pivoted.reporting_year
+    pivoted.reporting_year,
+    manifest.source_sha256
 from pivoted
+left join manifest
+    on pivoted.reporting_year = manifest.reporting_year
 left join indicators
     on
         pivoted.indicator_code = indicators.indicator_code
@@ -3,6 +3,6 @@ select
     INDICATOR_CODE as "indicator_code",
     MEASURE as "measure",
     VALUE as "value",
-    2023 as reporting_year
+    reporting_year
 from
-    {{ source('qof', 'achievement_2022_2023') }}
+    {{ source('qof', 'achievement') }}
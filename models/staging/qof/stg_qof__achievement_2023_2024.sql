@@ -1,8 +0,0 @@
-select
-    PRACTICE_CODE as "practice_code",
-    INDICATOR_CODE as "indicator_code",
-    MEASURE as "measure",
-    VALUE as "value",
-    2024 as reporting_year
-from
-    {{ source('qof', 'achievement_2023_2024') }}
@@ -0,0 +1,5 @@
+select
+    reporting_year,
+    source_sha256
+from
+    {{ source('qof', 'achievement_manifest') }}
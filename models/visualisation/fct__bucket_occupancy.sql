@@ -0,0 +1,54 @@
+{{
+  config(
+    materialized = 'table'
+  )
+}}
+
+-- Bucket labels must match the keys of BUCKET_SQL in visualization/constants.py.
+
+WITH achievement AS (
+    SELECT 'Practice' as level, indicator_code, reporting_year, percentage_patients_achieved
+    FROM {{ ref('fct__practice_achievement') }}
+    UNION ALL
+    SELECT 'PCN' as level, indicator_code, reporting_year, percentage_patients_achieved
+    FROM {{ ref('fct__pcn_achievement') }}
+    UNION ALL
+    SELECT 'Sub-ICB' as level, indicator_code, reporting_year, percentage_patients_achieved
+    FROM {{ ref('fct__sub_icb_achievement') }}
+    UNION ALL
+    SELECT 'ICB' as level, indicator_code, reporting_year, percentage_patients_achieved
+    FROM {{ ref('fct__icb_achievement') }}
+    UNION ALL
+    SELECT 'Region' as level, indicator_code, reporting_year, percentage_patients_achieved
+    FROM {{ ref('fct__region_achievement') }}
+),
+
+bucketed AS (
+    SELECT
+        level,
+        indicator_code,
+        reporting_year,
+        CASE
+            WHEN percentage_patients_achieved < 20 THEN '< 20 %'
+            WHEN percentage_patients_achieved < 40 THEN '20-40 %'
+            WHEN percentage_patients_achieved < 60 THEN '40-60 %'
+            WHEN percentage_patients_achieved < 80 THEN '60-80 %'
+            ELSE '80-100 %'
+        END as bucket,
+        percentage_patients_achieved
+    FROM achievement
+    WHERE percentage_patients_achieved IS NOT NULL
+)
+
+SELECT
+    level,
+    indicator_code,
+    reporting_year,
+    bucket,
+    COUNT(*) as n,
+    MIN(percentage_patients_achieved) as min_pct,
+    MAX(percentage_patients_achieved) as max_pct
+FROM bucketed
+GROUP BY level, indicator_code, reporting_year, bucket
+-- Sorted on the lookup key so row-group min/max pruning makes lookups cheap.
+ORDER BY level, indicator_code, reporting_year, bucket
@@ -120,3 +120,6 @@ UNION ALL
 SELECT * FROM region_ach
 UNION ALL
 SELECT * FROM national_ach
+-- Sorted so that lookups by level, organisation and year only read the
+-- row groups whose min/max statistics match
+ORDER BY level, organisation_code, reporting_year
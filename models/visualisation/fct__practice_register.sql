@@ -1,4 +1,4 @@
-select *
+select * exclude (source_sha256)
 from
     {{ ref('dim__practice_summary') }}
 where
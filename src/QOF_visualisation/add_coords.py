@@ -10,6 +10,8 @@ from duckdb import DuckDBPyConnection, DuckDBPyRelation
 
 from QOF_visualisation.batch_geocode import batch_geocode
 from QOF_visualisation.coord_dataclasses import PracticeAdd, PracticeCoords
+from QOF_visualisation.geocode_cache import GEOCODE_CACHE_NAME
+from QOF_visualisation.postcode_geocoder import POSTCODE_LOOKUP_ENV
 
 
 class Settings(NamedTuple):
@@ -19,24 +21,34 @@ class Settings(NamedTuple):
     conn: DuckDBPyConnection
     concurrent: int
     retries: int
+    postcode_lookup: Path | None
 
 
 def setup(target_file: Path, api_key: str | None, concurrent: int, retries: int) -> Settings:
     output_file: Path = target_file.with_stem(target_file.stem + "_new")
+    postcode_lookup: Path | None = get_postcode_lookup()
     if not api_key:
-        api_key = get_api_key()
+        api_key = get_api_key(required=postcode_lookup is None)
     conn: DuckDBPyConnection = duckdb.connect()
 
-    settings: Settings = Settings(target_file, output_file, api_key, conn, concurrent, retries)
+    settings: Settings = Settings(
+        target_file, output_file, api_key, conn, concurrent, retries, postcode_lookup
+    )
     return settings
 
 
-def get_api_key() -> str:
+def get_api_key(required: bool = True) -> str:
     load_dotenv()
     api_key: str | None = os.getenv("GOOGLE_MAPS_API_KEY")
-    if not api_key:
+    if not api_key and required:
         sys.exit("No api-key found")
-    return api_key
+    return api_key or ""
+
+
+def get_postcode_lookup() -> Path | None:
+    load_dotenv()
+    lookup: str = os.getenv(POSTCODE_LOOKUP_ENV, "")
+    return Path(lookup) if lookup else None
 
 
 def table_from_file(conn: DuckDBPyConnection, target_file: Path) -> DuckDBPyRelation:
@@ -91,6 +103,8 @@ def add_coords(
     results_list, failure_list = batch_geocode(
         null_list,
         settings.api_key,
+        cache_path=settings.target_file.parent / GEOCODE_CACHE_NAME,
+        postcode_lookup=settings.postcode_lookup,
     )
     print(f"Results list length: {len(results_list)}\nFailure list length: {len(failure_list)}")
     print(failure_list)
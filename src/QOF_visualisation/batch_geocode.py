@@ -1,85 +1,121 @@
 import asyncio
-import time
+from collections.abc import Sequence
+from pathlib import Path
 from typing import NamedTuple
 
-import googlemaps
 import httpx
 
 from QOF_visualisation.coord_dataclasses import PracticeAdd, PracticeCoords
+from QOF_visualisation.geocode_cache import GeocodeCache, GeocodeEntry
+from QOF_visualisation.geocoders import (
+    OK,
+    OVER_QUERY_LIMIT,
+    ZERO_RESULTS,
+    Geocoder,
+    GeocodeResult,
+    GoogleGeocoder,
+)
+from QOF_visualisation.postcode_geocoder import PostcodeGeocoder, extract_postcode
+from QOF_visualisation.rate_limit import DEFAULT_RATE, AdaptiveLimiter, backoff_delay
+
+# Attempts per address at requests answered with OVER_QUERY_LIMIT
+QUOTA_RETRIES: int = 10
 
 
 class GeocodeSettings(NamedTuple):
     practice_list: list[PracticeAdd]
     api_key: str
-    sem: asyncio.Semaphore
+    limiter: AdaptiveLimiter
     retries: int
+    cache: GeocodeCache | None
+    geocoder: Geocoder
 
 
 def setup(
-    practice_list: list[PracticeAdd], api_key: str, concurrent: int, retries: int
+    practice_list: list[PracticeAdd],
+    api_key: str,
+    concurrent: int,
+    retries: int,
+    cache: GeocodeCache | None = None,
+    geocoder: Geocoder | None = None,
+    rate: float = DEFAULT_RATE,
 ) -> GeocodeSettings:
-    sem = asyncio.Semaphore(concurrent)
-    settings = GeocodeSettings(practice_list, api_key, sem, retries)
+    limiter = AdaptiveLimiter(rate, max_concurrent=concurrent)
+    if geocoder is None:
+        geocoder = GoogleGeocoder(api_key)
+    settings = GeocodeSettings(practice_list, api_key, limiter, retries, cache, geocoder)
     return settings
 
 
-def check_addresses_sync(gmaps_sync: googlemaps.Client, p_add: PracticeAdd):
-    c = get_coordinates_sync(gmaps_sync, p_add, p_add.short_addr)
-    if isinstance(c, PracticeAdd):
-        c = get_coordinates_sync(gmaps_sync, p_add, p_add.long_addr)
-    return c
+def fallback_addresses(p_add: PracticeAdd) -> list[str]:
+    """Address variants for the second pass, for practices whose own addresses failed.
 
-
-def get_coordinates_sync(
-    gmaps: googlemaps.Client,
-    p_add: PracticeAdd,
-    address: str,
-    retries: int = 3,
-) -> PracticeCoords | PracticeAdd:
-    for attempt in range(retries):
-        try:
-            time.sleep(0.02)
-            result = gmaps.geocode(address)  # pyright: ignore[]
-            if not result:
-                return p_add
-            loc = result[0]["geometry"]["location"]
-            return PracticeCoords(p_add.practice_code, lat=loc["lat"], lon=loc["lon"])
-        except Exception:
-            delay = 2**attempt * 0.1
-            time.sleep(delay)
-    return p_add
+    The long address without the practice name, then the postcode alone.
+    """
+    variants: list[str] = []
+    street: str = ", ".join(p_add.long_addr.split(", ")[1:])
+    if street:
+        variants.append(street)
+    postcode: str | None = extract_postcode(p_add.short_addr)
+    if postcode:
+        variants.append(f"{postcode}, UK")
+    return [v for v in variants if v not in (p_add.short_addr, p_add.long_addr)]
 
 
 async def geocode_one(
-    session: httpx.AsyncClient, settings: GeocodeSettings, practice_add: PracticeAdd
+    session: httpx.AsyncClient,
+    settings: GeocodeSettings,
+    practice_add: PracticeAdd,
+    addresses: Sequence[str] | None = None,
 ) -> PracticeCoords | PracticeAdd:
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"key": settings.api_key}
-    async with settings.sem:
-        # try short, then long address
-        for address in (practice_add.short_addr, practice_add.long_addr):
-            params["address"] = address
-            for attempt in range(settings.retries):
-                r = await session.get(url, params=params)
-                data = r.json()
-                status = data.get("status")
-                if status == "OK":
-                    loc = data["results"][0]["geometry"]["location"]
-                    practice_coords = PracticeCoords(
-                        practice_add.practice_code, loc["lat"], loc["lng"]
-                    )
-                    return practice_coords
-                if status == "ZERO_RESULTS":
-                    break
-                await asyncio.sleep(2**attempt * 0.1)
-        # both failed
-        return practice_add
+    # try each address in turn, by default the short then the long address
+    if addresses is None:
+        addresses = (practice_add.short_addr, practice_add.long_addr)
+    for address in addresses:
+        entry: GeocodeEntry | None = settings.cache.get(address) if settings.cache else None
+        if entry is not None:
+            if entry.found:
+                return PracticeCoords(practice_add.practice_code, entry.lat, entry.lng)  # pyright: ignore[reportArgumentType]
+            continue
+        # quota errors are expected while the limiter adapts, so they get their own budget
+        attempt, quota_attempt = 0, 0
+        while attempt < settings.retries and quota_attempt < QUOTA_RETRIES:
+            async with settings.limiter.slot() as slot:
+                result: GeocodeResult = await settings.geocoder.geocode(session, address)
+                slot.status = result.status
+            if result.status == OK:
+                if settings.cache is not None:
+                    settings.cache.record(address, result.lat, result.lng)
+                practice_coords = PracticeCoords(
+                    practice_add.practice_code,
+                    result.lat,  # pyright: ignore[reportArgumentType]
+                    result.lng,  # pyright: ignore[reportArgumentType]
+                )
+                return practice_coords
+            if result.status == ZERO_RESULTS:
+                if settings.cache is not None:
+                    settings.cache.record(address, None, None)
+                break
+            if result.status == OVER_QUERY_LIMIT:
+                await asyncio.sleep(backoff_delay(quota_attempt, result.status))
+                quota_attempt += 1
+            else:
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+    # all failed
+    return practice_add
 
 
 async def _batch_geocode_async(
-    practice_list: list[PracticeAdd], api_key: str, concurrent: int = 10, retries: int = 3
+    practice_list: list[PracticeAdd],
+    api_key: str,
+    concurrent: int = 10,
+    retries: int = 3,
+    cache: GeocodeCache | None = None,
+    geocoder: Geocoder | None = None,
+    rate: float = DEFAULT_RATE,
 ) -> tuple[list[PracticeCoords], list[PracticeAdd]]:
-    settings = setup(practice_list, api_key, concurrent, retries)
+    settings = setup(practice_list, api_key, concurrent, retries, cache, geocoder, rate)
     async with httpx.AsyncClient(timeout=10.0) as session:
         tasks = [
             geocode_one(session, settings, practice_add) for practice_add in settings.practice_list
@@ -92,20 +128,84 @@ async def _batch_geocode_async(
             result for result in results if isinstance(result, PracticeAdd)
         ]
 
-    # sync fallback for any NULLs
-    gmaps_sync = googlemaps.Client(key=settings.api_key)
-    failed: list[PracticeAdd] = []
-    for p_add in unsuccesful:
-        c = check_addresses_sync(gmaps_sync, p_add)
-        if isinstance(c, PracticeCoords):
-            succesful.append(c)
-        if isinstance(c, PracticeAdd):
-            failed.append(c)
+        # second pass for any failures, with other address variants, on the same client and limiter
+        fallback_tasks = [
+            geocode_one(session, settings, p_add, fallback_addresses(p_add))
+            for p_add in unsuccesful
+        ]
+        fallback_results: list[PracticeCoords | PracticeAdd] = await asyncio.gather(*fallback_tasks)
+        rescued: list[PracticeCoords] = [
+            result for result in fallback_results if isinstance(result, PracticeCoords)
+        ]
+        failed: list[PracticeAdd] = [
+            result for result in fallback_results if isinstance(result, PracticeAdd)
+        ]
 
-    return succesful, failed
+    stats = settings.limiter.stats()
+    print(
+        f"Made {stats.requests} geocode requests, {stats.quota_errors} over quota; "
+        f"concurrency ended at {stats.limit:.1f} after {stats.decreases} cuts"
+    )
+    print(f"Second pass rescued {len(rescued)} of {len(unsuccesful)} practices")
+
+    return succesful + rescued, failed
+
+
+async def geocode_practices(
+    practice_list: list[PracticeAdd],
+    api_key: str,
+    concurrent: int = 10,
+    retries: int = 3,
+    cache_path: Path | None = None,
+    postcode_lookup: Path | None = None,
+    geocoder: Geocoder | None = None,
+    rate: float = DEFAULT_RATE,
+) -> tuple[list[PracticeCoords], list[PracticeAdd]]:
+    """Geocode practices, first from postcode centroids if a lookup file is given.
+
+    Only practices the postcode lookup cannot place are sent to the geocoder, which is the
+    Google API unless another Geocoder is given, consulting and updating the geocode cache at
+    cache_path if given. Requests are limited to rate per second, with at most concurrent in
+    flight. Without an api_key or geocoder they are returned as failures.
+    """
+    located: list[PracticeCoords] = []
+    if postcode_lookup:
+        postcode_geocoder = PostcodeGeocoder(postcode_lookup)
+        try:
+            located, practice_list = postcode_geocoder.locate(practice_list)
+        finally:
+            postcode_geocoder.close()
+        print(f"Placed {len(located)} practices by postcode, {len(practice_list)} left")
+    if not practice_list or not (api_key or geocoder):
+        return located, practice_list
+    if geocoder is None:
+        geocoder = GoogleGeocoder(api_key)
+
+    cache: GeocodeCache | None = GeocodeCache(cache_path) if cache_path else None
+    try:
+        succesful, failed = await _batch_geocode_async(
+            practice_list, api_key, concurrent, retries, cache, geocoder, rate
+        )
+    finally:
+        if cache is not None:
+            cache.save()
+            print(f"Geocode cache: {cache.hits} hits, {cache.misses} misses")
+    return located + succesful, failed
 
 
 def batch_geocode(
-    practice_list: list[PracticeAdd], api_key: str, concurrent: int = 10, retries: int = 3
+    practice_list: list[PracticeAdd],
+    api_key: str,
+    concurrent: int = 10,
+    retries: int = 3,
+    cache_path: Path | None = None,
+    postcode_lookup: Path | None = None,
+    geocoder: Geocoder | None = None,
+    rate: float = DEFAULT_RATE,
 ) -> tuple[list[PracticeCoords], list[PracticeAdd]]:
-    return asyncio.run(_batch_geocode_async(practice_list, api_key, concurrent, retries))
+    """Run geocode_practices from synchronous code. See geocode_practices for the arguments."""
+    return asyncio.run(
+        geocode_practices(
+            practice_list, api_key, concurrent, retries, cache_path, postcode_lookup, geocoder, rate
+        )
+    )
@@ -1,19 +1,16 @@
-import io
 import shutil
 import tempfile
 import zipfile
 from pathlib import Path
 
 import duckdb
-import requests
+
+from QOF_visualisation.get_sources import download_to_tempfile
 
 
 def download_and_extract_zip(url: str, extract_to: Path) -> list[Path]:
     print(f"Downloading: {url}")
-    response = requests.get(url)
-    response.raise_for_status()
-
-    with zipfile.ZipFile(io.BytesIO(response.content)) as z:
+    with download_to_tempfile(url) as archive, zipfile.ZipFile(archive) as z:
         # Clean up any old versions of extracted files
         for name in z.namelist():
             target_path = extract_to / name
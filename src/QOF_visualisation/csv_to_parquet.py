@@ -8,11 +8,61 @@
 For each directory in the list, load all files that match the passed in pattern into one parquet file.
 Files are saved in the same directory as their parent folder with lower case file names.
 Returns a list of the parquet file Path objects.
+
+Files can instead be written as one partition of a hive-partitioned dataset,
+e.g. sources/achievement/reporting_year=2024/data_0.parquet.
+
+convert_all runs several conversions at once, each on its own cursor of one shared connection.
 """
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import NamedTuple
+
+from duckdb import DuckDBPyConnection
+
+# Encoding of the NHS Digital source files. DuckDB decodes it while reading.
+SOURCE_ENCODING: str = "latin-1"
+
+# Number of conversions run at once by convert_all.
+DEFAULT_CONVERT_WORKERS: int = 3
+
+# DuckDB limits for the conversion connection, shared by all running conversions.
+DEFAULT_DUCKDB_THREADS: int = os.cpu_count() or 4
+DEFAULT_DUCKDB_MEMORY_LIMIT: str = "4GB"
+
+
+class ParquetProfile(NamedTuple):
+    """
+    Parquet writer settings.
+
+    order_by is an ORDER BY expression list, e.g. "INDICATOR_CODE, PRACTICE_CODE". Sorting on the
+    columns later filters use gives each row group tight min/max statistics to prune on.
+    """
+
+    compression: str = "zstd"
+    compression_level: int = 3
+    row_group_size: int = 122_880
+    order_by: str | None = None
+
 
-from duckdb import DuckDBPyConnection, DuckDBPyRelation
+# Default writer settings, and settings for the achievement files, which are filtered by indicator.
+DEFAULT_PROFILE: ParquetProfile = ParquetProfile()
+ACHIEVEMENT_PROFILE: ParquetProfile = ParquetProfile(
+    compression_level=9, order_by="INDICATOR_CODE, PRACTICE_CODE"
+)
+
+
+class ConversionJob(NamedTuple):
+    """Arguments for one csv_to_parquet call."""
+
+    csv_dir: Path
+    file_pattern: str
+    table_name: str | None = None
+    profile: ParquetProfile = DEFAULT_PROFILE
+    partition: str | None = None
 
 
 def csv_to_parquet(
@@ -20,11 +70,18 @@ def csv_to_parquet(
     csv_dir: Path,
     file_pattern: str,
     table_name: str | None = None,
+    profile: ParquetProfile = DEFAULT_PROFILE,
+    partition: str | None = None,
+    encoding: str = SOURCE_ENCODING,
 ) -> Path:
     """
     For each directory in the list, load all files that match the passed in pattern into one parquet file.
 
     Files are saved in the same directory as their parent folder with lower case file names.
+    The CSV files are read in their original encoding, and the parquet files are UTF-8.
+    The parquet codec, row-group size and sort order are taken from profile.
+    With a hive partition such as "reporting_year=2024", the file is written to
+    table_name/reporting_year=2024/data_0.parquet instead, replacing that partition.
     Returns a list of the parquet file Path objects.
     """
     # Set table and view names.
@@ -32,16 +89,75 @@ def csv_to_parquet(
         table_name = csv_dir.stem.lower()
     view_name: str = table_name + "_view"
     parquet_path: Path = csv_dir.parents[0] / (table_name + ".parquet")
+    if partition:
+        view_name = f"{table_name}_{partition.replace('=', '_')}_view"
+        parquet_path = csv_dir.parents[0] / table_name / partition / "data_0.parquet"
+        parquet_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Create view of data and create relation of it.
-    conn.read_csv(str(csv_dir / file_pattern)).create_view(view_name)
-    print(f"Created {parquet_path.name}")
-    view: DuckDBPyRelation = conn.view(view_name)
+    # Create view of data, write it to parquet, then drop the view.
+    start: float = time.perf_counter()
+    conn.sql(
+        "from read_csv($path, encoding = $encoding)",
+        params={"path": str(csv_dir / file_pattern), "encoding": encoding},
+    ).create_view(view_name)
+    try:
+        source: str = f"FROM {view_name}"
+        if profile.order_by:
+            source += f" ORDER BY {profile.order_by}"
+        quoted_path: str = str(parquet_path).replace("'", "''")
+        copied = conn.execute(
+            f"""
+            COPY ({source}) TO '{quoted_path}' (
+                FORMAT parquet,
+                COMPRESSION {profile.compression},
+                COMPRESSION_LEVEL {int(profile.compression_level)},
+                ROW_GROUP_SIZE {int(profile.row_group_size)}
+            )
+            """
+        ).fetchone()
+    finally:
+        conn.execute(f"DROP VIEW IF EXISTS {view_name}")
 
-    view.to_parquet(str(parquet_path))
+    rows: int = copied[0] if copied else 0
+    seconds: float = time.perf_counter() - start
+    # Written in one call so lines from concurrent conversions do not interleave.
+    print(
+        f"Created {parquet_path.relative_to(csv_dir.parents[0])}: {rows:,} rows in {seconds:.1f}s "
+        f"({rows / max(seconds, 1e-9):,.0f} rows/s)\n",
+        end="",
+    )
 
     return parquet_path
 
 
+def convert_all(
+    conn: DuckDBPyConnection,
+    jobs: list[ConversionJob],
+    max_workers: int = DEFAULT_CONVERT_WORKERS,
+    threads: int = DEFAULT_DUCKDB_THREADS,
+    memory_limit: str = DEFAULT_DUCKDB_MEMORY_LIMIT,
+) -> list[Path]:
+    """
+    Run csv_to_parquet for each job concurrently, at most max_workers at a time.
+
+    Each worker uses its own cursor of conn. The DuckDB thread and memory limits are set on conn
+    first, and are shared by every running conversion.
+    Returns the parquet Paths in the order of jobs.
+    """
+    conn.execute(f"SET threads = {int(threads)}")
+    conn.execute("SET memory_limit = $limit", {"limit": memory_limit})
+
+    def run(job: ConversionJob) -> Path:
+        with conn.cursor() as cursor:
+            return csv_to_parquet(cursor, **job._asdict())
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run, job) for job in jobs]
+        for future in as_completed(futures):
+            future.result()
+
+    return [future.result() for future in futures]
+
+
 if __name__ == "__main__":
     pass
@@ -5,7 +5,6 @@ This script visualizes QOF (Quality and Outcomes Framework) data using Dash & Du
 from __future__ import annotations
 
 import textwrap
-from pathlib import Path
 from typing import Final
 
 import dash
@@ -14,22 +13,27 @@ import plotly.graph_objects as go
 import polars as pl
 from dash import Input, Output, State, ctx, dcc, html
 from dash.development.base_component import Component
-import duckdb
 
-# Constants
-DB_PATH: Final[Path] = Path(__file__).parent.parent.parent / "qof_vis.db"
-
-# DuckDB connection with proper read-only mode
-conn = duckdb.connect(":memory:")
-conn.execute(f"ATTACH DATABASE '{DB_PATH}' AS source_db (READ_ONLY)")
+from QOF_visualisation.visualization.data_queries import (
+    get_achievement_by_org_level,
+    get_bucket_counts,
+    get_long_achievement_data,
+    get_long_national_achievement_data,
+)
+from QOF_visualisation.visualization.db_connection import (
+    DB_PATH,
+    prepared_query,
+    resolve_table,
+)
+from QOF_visualisation.visualization.startup_cache import get_startup_data
 
 # Constants for organization levels and achievement buckets
 ORG_TABLE: dict[str, str] = {
-    "Practice": "source_db.fct__practice_achievement",
-    "PCN": "source_db.fct__pcn_achievement",
-    "Sub-ICB": "source_db.fct__sub_icb_achievement",
-    "ICB": "source_db.fct__icb_achievement",
-    "Region": "source_db.fct__region_achievement",
+    "Practice": "qof_vis.fct__practice_achievement",
+    "PCN": "qof_vis.fct__pcn_achievement",
+    "Sub-ICB": "qof_vis.fct__sub_icb_achievement",
+    "ICB": "qof_vis.fct__icb_achievement",
+    "Region": "qof_vis.fct__region_achievement",
 }
 
 BUCKET_SQL: dict[str, str] = {
@@ -42,11 +46,6 @@ BUCKET_SQL: dict[str, str] = {
 DEFAULT_BUCKET: Final[str] = "80-100 %"
 
 
-def query(sql: str) -> pl.DataFrame:
-    """Execute a SQL query against the database and return a polars DataFrame."""
-    return pl.from_arrow(conn.execute(sql).arrow())
-
-
 def md_wrap(text: str | None, width: int = 80) -> str:
     """Wrap text for markdown display."""
     if not text:
@@ -74,119 +73,69 @@ def make_blank_bar(msg: str = "Click a point") -> go.Figure:
     return fig
 
 
-# Cache national averages in memory for better performance
-print("Caching national averages...")
-conn.execute("""
-    CREATE TABLE national_averages AS 
-    SELECT 
-        reporting_year, 
-        group_description, 
-        AVG(percentage_patients_achieved) as avg_achievement
-    FROM source_db.fct__national_achievement
-    WHERE percentage_patients_achieved IS NOT NULL
-    GROUP BY reporting_year, group_description
-""")
-
-# Initialize available years and indicators
-print("Fetching available years and indicators...")
-pairs: pl.DataFrame = query("""
-    SELECT DISTINCT indicator_code, reporting_year 
-    FROM source_db.fct__practice_achievement 
-    WHERE percentage_patients_achieved IS NOT NULL
-""")
-
-ALL_YEARS: list[int] = sorted([int(y) for y in pairs["reporting_year"].unique().to_list()])
-ALL_INDS: list[str] = sorted([str(i) for i in pairs["indicator_code"].unique().to_list()])
-
-# Cache indicator codes by year at startup using a single query
-codes_df: pl.DataFrame = query("""
-    SELECT DISTINCT indicator_code, reporting_year
-    FROM source_db.fct__practice_achievement
-    WHERE percentage_patients_achieved IS NOT NULL
-""")
-
-CODES_BY_YEAR: dict[int, list[str]] = {
-    int(year): sorted(
-        codes_df.filter(pl.col("reporting_year") == year)["indicator_code"]
-        .cast(str)
-        .unique()
-        .to_list()
+def build_layout(default_year: int | None = None, default_ind: str | None = None) -> html.Div:
+    """Build the page layout with the given default selections."""
+    return html.Div(
+        [
+            html.H3("QOF Performance Map"),
+            html.Div(
+                [
+                    dcc.Dropdown(
+                        id="yr",
+                        style={
+                            "width": 110,
+                            "minWidth": 110,
+                            "maxWidth": 110,
+                            "marginLeft": 8,
+                            "marginRight": 8,
+                        },
+                        value=default_year,
+                    ),
+                    dcc.Dropdown(
+                        id="ind",
+                        style={"width": 180, "minWidth": 180, "maxWidth": 180},
+                        value=default_ind,
+                    ),
+                    dcc.RadioItems(
+                        id="level",
+                        options=[{"label": k, "value": k} for k in ORG_TABLE],
+                        value="Practice",
+                        inline=True,
+                        style={"paddingLeft": 16},
+                    ),
+                    dcc.RadioItems(
+                        id="bucket",
+                        options=[{"label": k, "value": k} for k in BUCKET_SQL],
+                        value=DEFAULT_BUCKET,
+                        inline=True,
+                        style={"paddingLeft": 16},
+                    ),
+                ],
+                style={"display": "flex", "gap": 6, "alignItems": "center"},
+            ),
+            html.Div(id="desc", style={"fontSize": 14, "marginTop": 6}),
+            html.Div(
+                [
+                    dcc.Graph(
+                        id="map",
+                        style={"height": "82vh", "width": "60vw"},
+                        config={"scrollZoom": True},
+                    ),
+                    dcc.Graph(id="bars", style={"height": "82vh", "width": "38vw"}),
+                ],
+                style={"display": "flex", "gap": "1%"},
+            ),
+        ],
+        style={"padding": 12},
     )
-    for year in codes_df["reporting_year"].unique().to_list()
-}
 
-# Set default values for the dashboard
-DEFAULT_IND: str | None = ALL_INDS[0] if ALL_INDS else None
-DEFAULT_YEAR: int | None = ALL_YEARS[-1] if ALL_YEARS else None
-
-# Initialize Dash app
-app = dash.Dash(__name__)
-
-# App layout
-app.layout = html.Div(
-    [
-        html.H3("QOF Performance Map"),
-        html.Div(
-            [
-                dcc.Dropdown(
-                    id="yr",
-                    style={
-                        "width": 110,
-                        "minWidth": 110,
-                        "maxWidth": 110,
-                        "marginLeft": 8,
-                        "marginRight": 8,
-                    },
-                    value=DEFAULT_YEAR,
-                ),
-                dcc.Dropdown(
-                    id="ind",
-                    style={"width": 180, "minWidth": 180, "maxWidth": 180},
-                    value=DEFAULT_IND,
-                ),
-                dcc.RadioItems(
-                    id="level",
-                    options=[{"label": k, "value": k} for k in ORG_TABLE],
-                    value="Practice",
-                    inline=True,
-                    style={"paddingLeft": 16},
-                ),
-                dcc.RadioItems(
-                    id="bucket",
-                    options=[{"label": k, "value": k} for k in BUCKET_SQL],
-                    value=DEFAULT_BUCKET,
-                    inline=True,
-                    style={"paddingLeft": 16},
-                ),
-            ],
-            style={"display": "flex", "gap": 6, "alignItems": "center"},
-        ),
-        html.Div(id="desc", style={"fontSize": 14, "marginTop": 6}),
-        html.Div(
-            [
-                dcc.Graph(
-                    id="map", style={"height": "82vh", "width": "60vw"}, config={"scrollZoom": True}
-                ),
-                dcc.Graph(id="bars", style={"height": "82vh", "width": "38vw"}),
-            ],
-            style={"display": "flex", "gap": "1%"},
-        ),
-    ],
-    style={"padding": 12},
-)
+
+def serve_layout() -> html.Div:
+    """Build the page layout, loading startup data on the first page view."""
+    startup = get_startup_data()
+    return build_layout(startup.default_year, startup.default_indicator)
 
 
-@app.callback(
-    Output("ind", "options"),
-    Output("ind", "value"),
-    Output("yr", "options"),
-    Output("yr", "value"),
-    Output("bucket", "options"),
-    Output("bucket", "value"),
-    Input("ind", "value"),
-    Input("yr", "value"),
-    Input("level", "value"),
-)
 def sync_dropdowns(
     ind_val: str | None, yr_val: int | None, level_val: str | None
 ) -> tuple[
@@ -197,33 +146,28 @@ def sync_dropdowns(
     list[dict[str, str | bool]],
     str | None,
 ]:
+    startup = get_startup_data()
+
     # Always filter codes to those with data for the selected year, if a year is selected
     if yr_val is not None:
-        valid_ind: list[str] = CODES_BY_YEAR.get(int(yr_val), [])
+        valid_ind: list[str] = startup.codes_by_year.get(int(yr_val), [])
         ind_opts: list[dict[str, str]] = [{"label": i, "value": i} for i in valid_ind]
         ind_val = ind_val if ind_val in valid_ind else (valid_ind[0] if valid_ind else None)
     else:
-        ind_opts = [{"label": i, "value": i} for i in ALL_INDS]
-        ind_val = ind_val if ind_val in ALL_INDS else (ALL_INDS[0] if ALL_INDS else None)
-    yr_opts: list[dict[str, int]] = [{"label": y, "value": y} for y in ALL_YEARS]
+        all_inds: list[str] = startup.indicators
+        ind_opts = [{"label": i, "value": i} for i in all_inds]
+        ind_val = ind_val if ind_val in all_inds else (all_inds[0] if all_inds else None)
+    yr_opts: list[dict[str, int]] = [{"label": y, "value": y} for y in startup.years]
 
     # Always show all buckets, but disable those with no data for the selected org level
-    table: str = (
-        ORG_TABLE[level_val] if level_val in ORG_TABLE else "source_db.fct__practice_achievement"
-    )
+    level: str = level_val if level_val in ORG_TABLE else "Practice"
     bucket_opts: list[dict[str, str | bool]] = []
-    for label, cond in BUCKET_SQL.items():
-        count_df = query(
-            f"""
-            SELECT COUNT(*) as n
-            FROM {table}
-            WHERE indicator_code = '{ind_val}'
-              AND reporting_year = {yr_val}
-              AND percentage_patients_achieved {cond}
-            """
-        )
-        has_data: bool = count_df["n"].item() > 0
-        bucket_opts.append({"label": label, "value": label, "disabled": not has_data})
+    if ind_val is not None and yr_val is not None:
+        counts: dict[str, int] = get_bucket_counts(level, ind_val, yr_val)
+        for label, n in counts.items():
+            bucket_opts.append({"label": label, "value": label, "disabled": n == 0})
+    else:
+        bucket_opts = [{"label": k, "value": k, "disabled": True} for k in BUCKET_SQL]
 
     # Set selected_bucket to DEFAULT_BUCKET if available and enabled, else first enabled
     enabled_buckets: list[dict[str, str | bool]] = [
@@ -248,14 +192,6 @@ def sync_dropdowns(
     return ind_opts, ind_val, yr_opts, yr_val, bucket_opts, selected_bucket
 
 
-@app.callback(
-    Output("map", "figure"),
-    Output("desc", "children"),
-    Input("ind", "value"),
-    Input("yr", "value"),
-    Input("level", "value"),
-    Input("bucket", "value"),
-)
 def build_map(
     indic: str | None, yr: int | None, level: str | None, bucket: str | None
 ) -> tuple[go.Figure, Component | None]:
@@ -264,21 +200,8 @@ def build_map(
         return make_blank_map(), None
 
     # Get data from the correct organization level
-    table_name = ORG_TABLE.get(level, "source_db.fct__practice_achievement")
-    q = f"""
-        SELECT 
-            organisation_name,
-            organisation_code,
-            percentage_patients_achieved AS pct,
-            output_description AS descr,
-            lat,
-            lng
-        FROM {table_name}
-        WHERE indicator_code = '{indic}'
-        AND reporting_year = {yr}
-        AND percentage_patients_achieved {BUCKET_SQL[bucket]}
-    """
-    df = query(q)
+    table_name = ORG_TABLE.get(level, "qof_vis.fct__practice_achievement")
+    df = get_achievement_by_org_level(table_name, indic, yr, bucket)
     if df.is_empty():
         return make_blank_map(), None
 
@@ -288,7 +211,7 @@ def build_map(
         lat="lat",
         lon="lng",
         hover_name="organisation_name",
-        custom_data=["pct", "organisation_name"],
+        custom_data=["pct", "organisation_name", "organisation_code"],
         color_discrete_sequence=["#1f77b4"],
         zoom=6,
         height=700,
@@ -310,13 +233,6 @@ def build_map(
     return fig, dcc.Markdown(md_wrap(str(descr_val)))
 
 
-@app.callback(
-    Output("bars", "figure"),
-    Input("map", "clickData"),
-    State("ind", "value"),
-    State("yr", "value"),
-    State("level", "value"),
-)
 def build_bars(
     click: dict[str, list[dict[str, list[str | float]]]] | None,
     indic: str | None,
@@ -327,63 +243,29 @@ def build_bars(
     if not click or indic is None or yr is None or level is None:
         return make_blank_bar()
 
-    # Get organization name from click data
+    # Get organization name and code from click data
     clicked_point = click["points"][0]
-    if not clicked_point.get("customdata") or len(clicked_point["customdata"]) < 2:
+    if not clicked_point.get("customdata") or len(clicked_point["customdata"]) < 3:
         return make_blank_bar("Invalid click data")
 
     org_name = str(clicked_point["customdata"][1])
-    org_name_sql = org_name.replace("'", "''")
-
-    # Get organization-level achievement data
-    table_name = ORG_TABLE.get(level, "source_db.fct__practice_achievement")
-    org_df = query(f"""
-        WITH group_avgs AS (
-            SELECT
-                group_description,
-                COUNT(DISTINCT indicator_code) as indicators,
-                AVG(percentage_patients_achieved) as org_achievement
-            FROM {table_name}
-            WHERE organisation_name = '{org_name_sql}'
-            AND reporting_year = {yr}
-            AND percentage_patients_achieved IS NOT NULL
-            GROUP BY group_description
-        )
-        SELECT 
-            group_description,
-            org_achievement
-        FROM group_avgs
-        WHERE indicators > 0
-        ORDER BY group_description
-    """)
-
-    # Get national averages for comparison
-    nat_sql = f"""
-        WITH nat_avgs AS (
-            SELECT
-                group_description,
-                COUNT(DISTINCT indicator_code) as indicators,
-                AVG(percentage_patients_achieved) as nat_achievement
-            FROM source_db.fct__national_achievement
-            WHERE reporting_year = {yr}
-            AND percentage_patients_achieved IS NOT NULL
-            GROUP BY group_description
-        )
-        SELECT 
-            group_description,
-            nat_achievement
-        FROM nat_avgs
-        WHERE indicators > 0
-        ORDER BY group_description
-    """
-    nat_df = query(nat_sql)
+    org_code = str(clicked_point["customdata"][2])
+
+    # Get organization and national group averages from the long model, by code
+    table_name = resolve_table(ORG_TABLE.get(level, "qof_vis.fct__practice_achievement"))
+    org_df = get_long_achievement_data(level, org_code, yr).select(
+        "group_description", pl.col("achievement").alias("org_achievement")
+    )
+    nat_df = get_long_national_achievement_data(yr).select(
+        "group_description", pl.col("achievement").alias("nat_achievement")
+    )
 
     if org_df.is_empty() and nat_df.is_empty():
         return make_blank_bar(f"No data for {org_name} or National Average in {yr}")
 
     # Combine data using full join and handle missing values
     if not org_df.is_empty() and not nat_df.is_empty():
-        combined_df = org_df.join(nat_df, on="group_description", how="full")
+        combined_df = org_df.join(nat_df, on="group_description", how="full", coalesce=True)
     elif not org_df.is_empty():
         combined_df = org_df.with_columns(pl.lit(None).cast(pl.Float64).alias("nat_achievement"))
     else:
@@ -419,13 +301,17 @@ def build_bars(
 
     # Highlight current indicator group if applicable
     if indic:
-        group_df = query(f"""
+        group_df = prepared_query(
+            f"dashboard_indicator_group:{table_name}",
+            f"""
             SELECT DISTINCT group_description
             FROM {table_name}
-            WHERE indicator_code = '{indic}'
-            AND reporting_year = {yr}
+            WHERE indicator_code = ?
+            AND reporting_year = ?
             LIMIT 1
-        """)
+            """,
+            [indic, yr],
+        )
         if not group_df.is_empty():
             current_group = group_df["group_description"][0]
             if current_group in plot_df["Group"].unique():
@@ -470,6 +356,49 @@ def build_bars(
     return fig
 
 
+def create_app() -> dash.Dash:
+    """Create the Dash app and register its callbacks without touching the database."""
+    app = dash.Dash(__name__)
+    # A data-free validation layout stops Dash calling serve_layout at assignment
+    app.validation_layout = build_layout()
+    app.layout = serve_layout
+
+    app.callback(
+        Output("ind", "options"),
+        Output("ind", "value"),
+        Output("yr", "options"),
+        Output("yr", "value"),
+        Output("bucket", "options"),
+        Output("bucket", "value"),
+        Input("ind", "value"),
+        Input("yr", "value"),
+        Input("level", "value"),
+    )(sync_dropdowns)
+
+    app.callback(
+        Output("map", "figure"),
+        Output("desc", "children"),
+        Input("ind", "value"),
+        Input("yr", "value"),
+        Input("level", "value"),
+        Input("bucket", "value"),
+    )(build_map)
+
+    app.callback(
+        Output("bars", "figure"),
+        Input("map", "clickData"),
+        State("ind", "value"),
+        State("yr", "value"),
+        State("level", "value"),
+    )(build_bars)
+
+    return app
+
+
+# Initialize Dash app; the database is opened lazily on first use
+app = create_app()
+server = app.server
+
 if __name__ == "__main__":
     print(f"Starting QOF Visualization app with data from {DB_PATH}")
     app.run(debug=True, use_reloader=False)
@@ -11,7 +11,16 @@ import polars as pl
 from dash import Input, Output, State, ctx, dcc, html
 from dash.development.base_component import Component
 
-from QOF_visualisation.visualization.db_connection import query
+from QOF_visualisation.visualization.data_queries import (
+    get_achievement_by_org_level,
+    get_bucket_counts,
+)
+from QOF_visualisation.visualization.db_connection import (
+    prepared_query,
+    query,
+    resolve_table,
+)
+from QOF_visualisation.visualization.visualization_utils import create_map
 
 # Constants for organization levels and achievement buckets
 ORG_TABLE: dict[str, str] = {
@@ -208,20 +217,13 @@ def sync_dropdowns(
     yr_opts = [{"label": y, "value": y} for y in ALL_YEARS]
 
     # Show all buckets but disable those with no data
-    table = ORG_TABLE.get(level_val or "Practice", "qof_vis.fct__practice_achievement")
+    level = level_val if level_val in ORG_TABLE else "Practice"
     bucket_opts = []
 
     if ind_val is not None and yr_val is not None:
-        for label, cond in BUCKET_SQL.items():
-            count_df = query(f"""
-                SELECT COUNT(*) as n
-                FROM {table}
-                WHERE indicator_code = '{ind_val}'
-                AND reporting_year = {yr_val}
-                AND percentage_patients_achieved {cond}
-            """)
-            has_data = count_df["n"].item() > 0
-            bucket_opts.append({"label": label, "value": label, "disabled": not has_data})
+        counts = get_bucket_counts(level, ind_val, yr_val)
+        for label, n in counts.items():
+            bucket_opts.append({"label": label, "value": label, "disabled": n == 0})
     else:
         bucket_opts = [{"label": k, "value": k, "disabled": True} for k in BUCKET_SQL]
 
@@ -262,60 +264,12 @@ def build_map(
 
     # Get data from the correct organization level
     table_name = ORG_TABLE.get(level, "qof_vis.fct__practice_achievement")
-    q = f"""
-        SELECT 
-            organisation_name,
-            organisation_code,
-            percentage_patients_achieved AS pct,
-            output_description AS descr,
-            lat,
-            lng
-        FROM {table_name}
-        WHERE indicator_code = '{indic}'
-        AND reporting_year = {yr}
-        AND percentage_patients_achieved {BUCKET_SQL[bucket]}
-    """
-    df = query(q)
+    df = get_achievement_by_org_level(table_name, indic, yr, bucket)
     if df.is_empty():
         return make_blank_map(), None
 
-    # Create the map using Scattermap
-    fig = go.Figure(
-        data=[
-            go.Scattermap(
-                lat=df["lat"].to_list(),
-                lon=df["lng"].to_list(),
-                mode="markers",
-                marker=dict(
-                    size=6,
-                    color="#1f77b4",
-                    opacity=0.95,  # More opaque
-                ),
-                hoverinfo="text",
-                text=[
-                    f"<b>{name}</b><br>{pct:.1f}%"
-                    for name, pct in zip(
-                        df["organisation_name"].to_list(), df["pct"].to_list(), strict=True
-                    )
-                ],
-                customdata=list(
-                    zip(df["pct"].to_list(), df["organisation_name"].to_list(), strict=True)
-                ),
-            )
-        ]
-    )
-
-    # Configure map with proper zoom and bounds
-    fig.update_layout(
-        margin=dict(t=0, r=0, l=0, b=0),
-        height=700,
-        uirevision="constant",  # Maintain zoom/pan state
-        mapbox=dict(
-            style="carto-positron",
-            zoom=6.0,  # Try different zoom level
-            center=dict(lat=54.5, lon=-2),
-        ),
-    )
+    # Create the map from typed arrays with a browser-side hovertemplate
+    fig = create_map(df)
 
     # Add description
     descr_val = df["descr"][0] if df.height > 0 else ""
@@ -330,7 +284,7 @@ def build_map(
     State("level", "value"),
 )
 def build_bars(
-    click: dict[str, list[dict[str, list[str | float]]]] | None,
+    click: dict[str, list[dict[str, str | float]]] | None,
     indic: str | None,
     yr: int | None,
     level: str | None,
@@ -349,61 +303,63 @@ def build_bars(
     if not click or indic is None or yr is None or level is None:
         return make_blank_bar()
 
-    # Get organization name from click data
+    # Get organization code and name from click data
     clicked_point = click["points"][0]
-    if not clicked_point.get("customdata") or len(clicked_point["customdata"]) < 2:
+    if not clicked_point.get("id") or not clicked_point.get("text"):
         return make_blank_bar("Invalid click data")
 
-    org_name = str(clicked_point["customdata"][1])
-    org_name_sql = org_name.replace("'", "''")  # Escape single quotes for SQL
+    org_code = str(clicked_point["id"])
+    org_name = str(clicked_point["text"])
 
     # Get organization-level achievement data
-    table_name = ORG_TABLE.get(level or "Practice", "qof_vis.fct__practice_achievement")
+    table_name = resolve_table(
+        ORG_TABLE.get(level or "Practice", "qof_vis.fct__practice_achievement")
+    )
     org_sql = f"""
         WITH group_avgs AS (
             SELECT
                 a.group_code,
                 a.group_description,
                 COUNT(DISTINCT a.indicator_code) as indicators,
-                AVG(CASE WHEN a.percentage_patients_achieved IS NOT NULL 
-                         THEN a.percentage_patients_achieved 
+                AVG(CASE WHEN a.percentage_patients_achieved IS NOT NULL
+                         THEN a.percentage_patients_achieved
                          ELSE NULL END) as achievement
             FROM {table_name} a
-            WHERE a.organisation_name = '{org_name_sql}'
-            AND a.reporting_year = {yr}
+            WHERE a.organisation_code = ?
+            AND a.reporting_year = ?
             GROUP BY a.group_code, a.group_description
             HAVING COUNT(DISTINCT a.indicator_code) > 0
         )
-        SELECT 
+        SELECT
             group_description,
             achievement
         FROM group_avgs
         ORDER BY group_description DESC
     """
-    org_df = query(org_sql)
+    org_df = prepared_query(f"db_vis_org_group_avgs:{table_name}", org_sql, [org_code, yr])
 
     # Get national averages for comparison
-    nat_sql = f"""
+    nat_sql = """
         WITH nat_avgs AS (
             SELECT
                 n.group_code,
                 n.group_description,
                 COUNT(DISTINCT n.indicator_code) as indicators,
-                AVG(CASE WHEN n.percentage_patients_achieved IS NOT NULL 
-                         THEN n.percentage_patients_achieved 
+                AVG(CASE WHEN n.percentage_patients_achieved IS NOT NULL
+                         THEN n.percentage_patients_achieved
                          ELSE NULL END) as achievement
             FROM qof_vis.fct__national_achievement n
-            WHERE n.reporting_year = {yr}
+            WHERE n.reporting_year = ?
             GROUP BY n.group_code, n.group_description
             HAVING COUNT(DISTINCT n.indicator_code) > 0
         )
-        SELECT 
+        SELECT
             group_description,
             achievement
         FROM nat_avgs
         ORDER BY group_description DESC
     """
-    nat_df = query(nat_sql)
+    nat_df = prepared_query("db_vis_nat_group_avgs", nat_sql, [yr])
 
     if org_df.is_empty() and nat_df.is_empty():
         return make_blank_bar(f"No data for {org_name} or National Average in {yr}")
@@ -0,0 +1,73 @@
+"""
+Conditional-request cache for downloaded source archives.
+
+Stores the ETag, Last-Modified and SHA-256 of the last download of each URL in a JSON file.
+The stored validators are sent back as If-None-Match / If-Modified-Since, so unchanged archives
+can be answered with 304 Not Modified. Servers that send no validators are caught by the hash.
+"""
+
+import json
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Validators and content hash of one downloaded archive."""
+
+    etag: str | None
+    last_modified: str | None
+    sha256: str
+
+
+class DownloadCache:
+    """URL-keyed record of downloaded archives, saved as JSON."""
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self._lock: threading.Lock = threading.Lock()
+        self._entries: dict[str, CacheEntry] = {}
+        if path.exists():
+            try:
+                raw: dict[str, dict[str, str | None]] = json.loads(path.read_text())
+                self._entries = {url: CacheEntry(**entry) for url, entry in raw.items()}  # type: ignore[arg-type]
+            except (ValueError, TypeError):
+                print(f"Ignoring unreadable download cache: {path}")
+
+    def get(self, url: str) -> CacheEntry | None:
+        """Return the record of the last download of a URL, if any."""
+        with self._lock:
+            return self._entries.get(url)
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """Return the request headers that ask the server to skip an unchanged archive."""
+        entry: CacheEntry | None = self.get(url)
+        headers: dict[str, str] = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def record(self, url: str, entry: CacheEntry) -> bool:
+        """Record a completed download. Returns False if its content matches the last download."""
+        with self._lock:
+            previous: CacheEntry | None = self._entries.get(url)
+            self._entries[url] = entry
+        return previous is None or previous.sha256 != entry.sha256
+
+    def forget(self, url: str) -> None:
+        """Drop a URL so its next download is unconditional and always counts as changed."""
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def save(self) -> None:
+        """Write the cache to disk, replacing the previous file atomically."""
+        with self._lock:
+            raw: dict[str, dict[str, str | None]] = {
+                url: asdict(entry) for url, entry in self._entries.items()
+            }
+        tmp_path: Path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(raw, indent=2))
+        tmp_path.replace(self.path)
@@ -0,0 +1,114 @@
+"""
+Persistent cache of geocoding results.
+
+Results are keyed by the SHA-256 of the normalized address string and stored in a parquet
+file, so re-runs only query the geocoding API for addresses that are new or have changed.
+Addresses the API could not find (ZERO_RESULTS) are cached too, with a shorter lifetime,
+so they are not retried on every run. Transient errors are never cached.
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import duckdb
+
+# Lifetime of a found address, in seconds
+FOUND_TTL: int = 180 * 24 * 60 * 60
+
+# Lifetime of an address the API could not find, in seconds
+NOT_FOUND_TTL: int = 30 * 24 * 60 * 60
+
+GEOCODE_CACHE_NAME: str = ".geocode_cache.parquet"
+
+
+@dataclass(frozen=True)
+class GeocodeEntry:
+    """Result of geocoding one address. lat and lng are None if it was not found."""
+
+    lat: float | None
+    lng: float | None
+    fetched_at: float
+
+    @property
+    def found(self) -> bool:
+        return self.lat is not None and self.lng is not None
+
+
+def normalize_address(address: str) -> str:
+    """Lower-case an address and collapse the whitespace and commas between its parts."""
+    parts: list[str] = [" ".join(part.split()) for part in address.lower().split(",")]
+    return ", ".join(part for part in parts if part)
+
+
+def address_key(address: str) -> str:
+    """Return the cache key of an address."""
+    return hashlib.sha256(normalize_address(address).encode()).hexdigest()
+
+
+class GeocodeCache:
+    """Address-keyed geocoding results with expiry, saved as parquet."""
+
+    def __init__(
+        self, path: Path, found_ttl: int = FOUND_TTL, not_found_ttl: int = NOT_FOUND_TTL
+    ) -> None:
+        self.path: Path = path
+        self.found_ttl: int = found_ttl
+        self.not_found_ttl: int = not_found_ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: dict[str, GeocodeEntry] = {}
+        if path.exists():
+            try:
+                rows = duckdb.sql(
+                    "from read_parquet($path) select address_key, lat, lng, fetched_at",
+                    params={"path": str(path)},
+                ).fetchall()
+                self._entries = {key: GeocodeEntry(lat, lng, ts) for key, lat, lng, ts in rows}
+            except duckdb.Error:
+                print(f"Ignoring unreadable geocode cache: {path}")
+
+    def _expired(self, entry: GeocodeEntry, now: float) -> bool:
+        ttl: int = self.found_ttl if entry.found else self.not_found_ttl
+        return now - entry.fetched_at > ttl
+
+    def get(self, address: str) -> GeocodeEntry | None:
+        """Return the cached result for an address, or None if it is missing or expired."""
+        entry: GeocodeEntry | None = self._entries.get(address_key(address))
+        if entry is None or self._expired(entry, time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def record(self, address: str, lat: float | None, lng: float | None) -> None:
+        """Record a definitive result. Pass lat and lng as None for an address that was not found."""
+        self._entries[address_key(address)] = GeocodeEntry(lat, lng, time.time())
+
+    def save(self) -> None:
+        """Write the unexpired entries to disk, replacing the previous file atomically."""
+        now: float = time.time()
+        live: dict[str, GeocodeEntry] = {
+            key: entry for key, entry in self._entries.items() if not self._expired(entry, now)
+        }
+        tmp_path: Path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with duckdb.connect() as conn:
+            conn.execute(
+                """
+                create table geocode_cache as
+                select
+                    unnest($keys) as address_key,
+                    unnest($lats)::double as lat,
+                    unnest($lngs)::double as lng,
+                    unnest($fetched)::double as fetched_at
+                """,
+                {
+                    "keys": list(live),
+                    "lats": [entry.lat for entry in live.values()],
+                    "lngs": [entry.lng for entry in live.values()],
+                    "fetched": [entry.fetched_at for entry in live.values()],
+                },
+            )
+            conn.execute(f"copy geocode_cache to '{tmp_path}' (format parquet)")
+        tmp_path.replace(self.path)
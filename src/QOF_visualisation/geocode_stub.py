@@ -0,0 +1,247 @@
+"""
+Local stand-in for the Google Geocoding API, for load testing the geocoding pipeline.
+
+Answers /geocode/json requests with canned responses in the Google JSON format, after a
+configurable latency, and injects ZERO_RESULTS, OVER_QUERY_LIMIT, UNKNOWN_ERROR and HTTP 500
+responses at configurable rates. Coordinates are derived from a hash of the address, so repeat
+runs return the same results. Point a GoogleGeocoder at the server's url to use it.
+
+Typical usage example:
+    with GeocodeStubServer(StubConfig(latency=0.05, error_rate=0.02)) as server:
+        located, failed = batch_geocode(practices, "", geocoder=server.geocoder())
+    print(server.stats())
+
+Or standalone:
+    python -m QOF_visualisation.geocode_stub --port 8765 --latency 0.05 --quota-rate 0.01
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from QOF_visualisation.geocoders import OK, OVER_QUERY_LIMIT, ZERO_RESULTS, GoogleGeocoder
+
+
+@dataclass(frozen=True)
+class StubConfig:
+    """Behaviour of the stub server.
+
+    The *_rate fields are probabilities per request. qps_limit emulates the API quota: requests
+    beyond that many in the last second are answered with OVER_QUERY_LIMIT.
+    """
+
+    latency: float = 0.05
+    jitter: float = 0.0
+    not_found_rate: float = 0.0
+    quota_rate: float = 0.0
+    error_rate: float = 0.0
+    http_error_rate: float = 0.0
+    qps_limit: float | None = None
+    seed: int | None = None
+
+
+@dataclass
+class StubStats:
+    """Counters of the requests the stub server has answered."""
+
+    requests: int = 0
+    ok: int = 0
+    not_found: int = 0
+    over_query_limit: int = 0
+    errors: int = 0
+    max_in_flight: int = 0
+
+
+def canned_location(address: str) -> tuple[float, float]:
+    """Return a stable point in England for an address."""
+    digest: bytes = hashlib.sha256(address.encode()).digest()
+    lat: float = 50.0 + int.from_bytes(digest[:4]) / 2**32 * 5.0
+    lng: float = -5.0 + int.from_bytes(digest[4:8]) / 2**32 * 6.5
+    return round(lat, 6), round(lng, 6)
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for a full batch of concurrent connections; the default backlog of 5 drops SYNs
+    request_queue_size = 256
+
+
+class GeocodeStubServer:
+    """Threaded HTTP server answering geocode requests in a background thread."""
+
+    def __init__(
+        self, config: StubConfig | None = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        config = config or StubConfig()
+        self.config: StubConfig = config
+        self._random: random.Random = random.Random(config.seed)
+        self._stats: StubStats = StubStats()
+        self._in_flight: int = 0
+        self._recent: deque[float] = deque()
+        self._lock: threading.Lock = threading.Lock()
+        self._server: ThreadingHTTPServer = _StubHTTPServer((host, port), self._handler())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/geocode/json"
+
+    def geocoder(self) -> GoogleGeocoder:
+        """Return a GoogleGeocoder that sends its requests to this server."""
+        return GoogleGeocoder("stub", self.url)
+
+    def stats(self) -> StubStats:
+        with self._lock:
+            return StubStats(**vars(self._stats))
+
+    def serve(self) -> None:
+        """Serve in the current thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self) -> "GeocodeStubServer":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "GeocodeStubServer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def _over_quota(self) -> bool:
+        """Count a request against the one-second quota window. Caller holds the lock."""
+        if self.config.qps_limit is None:
+            return False
+        now: float = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.config.qps_limit:
+            return True
+        self._recent.append(now)
+        return False
+
+    def _respond(self, address: str) -> tuple[int, dict[str, Any]]:
+        """Pick the response for one request and update the counters."""
+        config = self.config
+        with self._lock:
+            over_quota: bool = self._over_quota()
+            roll: float = self._random.random()
+            delay: float = config.latency + self._random.uniform(0, config.jitter)
+            self._stats.requests += 1
+            self._in_flight += 1
+            self._stats.max_in_flight = max(self._stats.max_in_flight, self._in_flight)
+        try:
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        thresholds: list[tuple[float, str]] = [
+            (config.http_error_rate, "http_error"),
+            (config.quota_rate, OVER_QUERY_LIMIT),
+            (config.error_rate, "UNKNOWN_ERROR"),
+            (config.not_found_rate, ZERO_RESULTS),
+        ]
+        outcome: str = OK
+        if over_quota:
+            outcome = OVER_QUERY_LIMIT
+        else:
+            for rate, name in thresholds:
+                if roll < rate:
+                    outcome = name
+                    break
+                roll -= rate
+
+        with self._lock:
+            if outcome == OK:
+                self._stats.ok += 1
+            elif outcome == ZERO_RESULTS:
+                self._stats.not_found += 1
+            elif outcome == OVER_QUERY_LIMIT:
+                self._stats.over_query_limit += 1
+            else:
+                self._stats.errors += 1
+
+        if outcome == "http_error":
+            return 500, {}
+        if outcome != OK:
+            return 200, {"status": outcome, "results": []}
+        lat, lng = canned_location(address)
+        return 200, {
+            "status": OK,
+            "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}],
+        }
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                query: dict[str, list[str]] = parse_qs(urlparse(self.path).query)
+                code, body = stub._respond(query.get("address", [""])[0])
+                payload: bytes = json.dumps(body).encode() if body else b"Internal Server Error"
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json" if body else "text/plain")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local stand-in geocoding server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.0)
+    parser.add_argument("--quota-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--http-error-rate", type=float, default=0.0)
+    parser.add_argument("--qps-limit", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        args.latency,
+        args.jitter,
+        args.not_found_rate,
+        args.quota_rate,
+        args.error_rate,
+        args.http_error_rate,
+        args.qps_limit,
+        args.seed,
+    )
+    server = GeocodeStubServer(config, port=args.port)
+    print(f"Serving stub geocoder at {server.url}")
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    print(server.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Geocoder backends for the async geocoding pipeline.
+
+A Geocoder turns one address into a GeocodeResult. The statuses follow the Google Geocoding
+API: "OK" and "ZERO_RESULTS" are definitive, anything else is treated as transient and retried.
+Backends: GoogleGeocoder (also used against the local stub server in geocode_stub) and
+PostcodeGeocoder in postcode_geocoder.
+"""
+
+from typing import NamedTuple, Protocol
+
+import httpx
+
+GOOGLE_GEOCODE_URL: str = "https://maps.googleapis.com/maps/api/geocode/json"
+
+OK: str = "OK"
+ZERO_RESULTS: str = "ZERO_RESULTS"
+OVER_QUERY_LIMIT: str = "OVER_QUERY_LIMIT"
+
+# Status reported when no usable response was received
+REQUEST_FAILED: str = "REQUEST_FAILED"
+
+
+class GeocodeResult(NamedTuple):
+    status: str
+    lat: float | None = None
+    lng: float | None = None
+
+
+class Geocoder(Protocol):
+    async def geocode(self, session: httpx.AsyncClient, address: str) -> GeocodeResult:
+        """Geocode one address. Must not raise for failed requests; report them as a status."""
+        ...
+
+
+class GoogleGeocoder:
+    """Geocoder for the Google Geocoding API, or any server that speaks its JSON format."""
+
+    def __init__(self, api_key: str, url: str = GOOGLE_GEOCODE_URL) -> None:
+        self.api_key: str = api_key
+        self.url: str = url
+
+    async def geocode(self, session: httpx.AsyncClient, address: str) -> GeocodeResult:
+        try:
+            r = await session.get(self.url, params={"key": self.api_key, "address": address})
+            data = r.json()
+        except (httpx.HTTPError, ValueError):
+            return GeocodeResult(REQUEST_FAILED)
+        status: str = data.get("status", REQUEST_FAILED)
+        if status != OK:
+            return GeocodeResult(status)
+        loc = data["results"][0]["geometry"]["location"]
+        return GeocodeResult(OK, loc["lat"], loc["lng"])
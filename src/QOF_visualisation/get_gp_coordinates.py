@@ -1,36 +1,33 @@
 import asyncio
-import io
 import os
 import shutil
-import time
 import zipfile
 from pathlib import Path
-from typing import NamedTuple, cast
 
 import duckdb
-import googlemaps
-import httpx
-import requests
 from dotenv import load_dotenv
 
+from QOF_visualisation.batch_geocode import geocode_practices
+from QOF_visualisation.coord_dataclasses import PracticeAdd, PracticeCoords
+from QOF_visualisation.geocode_cache import GEOCODE_CACHE_NAME
+from QOF_visualisation.geocoders import Geocoder
+from QOF_visualisation.get_sources import download_to_tempfile
+from QOF_visualisation.postcode_geocoder import POSTCODE_LOOKUP_ENV
+from QOF_visualisation.rate_limit import DEFAULT_RATE
+
 load_dotenv()
 
 API_KEY: str | None = os.getenv("GOOGLE_MAPS_API_KEY")
+POSTCODE_LOOKUP: str | None = os.getenv(POSTCODE_LOOKUP_ENV)
 TARGET_DIR: Path = Path(os.getenv("TARGET_DIRECTORY", ""))
 MAX_CONCURRENT: int = 10
+MAX_RATE: float = DEFAULT_RATE
 RETRIES: int = 3
 
 
-class Coordinates(NamedTuple):
-    lat: float | None
-    lng: float | None
-
-
 def download_and_extract_zip(url: str, extract_to: Path) -> list[Path]:
     print(f"Downloading: {url}")
-    resp = requests.get(url)
-    resp.raise_for_status()
-    with zipfile.ZipFile(io.BytesIO(resp.content)) as z:
+    with download_to_tempfile(url) as archive, zipfile.ZipFile(archive) as z:
         for name in z.namelist():
             tp = extract_to / name
             if tp.exists():
@@ -74,62 +71,7 @@ def create_address_list(address_csv: Path, gp_list_csv: Path) -> Path:
     return output_path
 
 
-def get_coordinates_sync(
-    gmaps: googlemaps.Client,
-    address: str,
-    retries: int = 3,
-) -> Coordinates:
-    for attempt in range(retries):
-        try:
-            time.sleep(0.02)
-            result = gmaps.geocode(address)  # pyright: ignore[]
-            if not result:
-                return Coordinates(lat=None, lng=None)
-            loc: dict[str, float] = cast(dict[str, float], result[0]["geometry"]["location"])
-            return Coordinates(lat=loc["lat"], lng=loc["lng"])
-        except Exception:
-            delay = 2**attempt * 0.1
-            time.sleep(delay)
-    return Coordinates(lat=None, lng=None)
-
-
-async def geocode_one(
-    session: httpx.AsyncClient,
-    sem: asyncio.Semaphore,
-    practice_code: str,
-    short_addr: str,
-    long_addr: str,
-) -> tuple[str, float | None, float | None]:
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"key": API_KEY}
-    async with sem:
-        # try short, then long address
-        for address in (short_addr, long_addr):
-            params["address"] = address
-            for attempt in range(RETRIES):
-                r = await session.get(url, params=params)
-                data = r.json()
-                status = data.get("status")
-                if status == "OK":
-                    loc = data["results"][0]["geometry"]["location"]
-                    return practice_code, loc["lat"], loc["lng"]
-                if status == "ZERO_RESULTS":
-                    break
-                await asyncio.sleep(2**attempt * 0.1)
-        # both failed
-        return practice_code, None, None
-
-
-async def batch_geocode(
-    addresses: list[tuple[str, str, str]],
-) -> list[tuple[str, float | None, float | None]]:
-    sem = asyncio.Semaphore(MAX_CONCURRENT)
-    async with httpx.AsyncClient(timeout=10.0) as session:
-        tasks = [geocode_one(session, sem, code, short, long) for code, short, long in addresses]
-        return await asyncio.gather(*tasks)
-
-
-async def main():
+async def main(geocoder: Geocoder | None = None):
     # prepare output dir
     TARGET_DIR.mkdir(exist_ok=True)
 
@@ -158,24 +100,26 @@ async def main():
             """
         ).fetchall()
 
-    # async geocode
-    coords: list[tuple[str, float | None, float | None]] = await batch_geocode(addresses)
-
-    # sync fallback for any NULLs
-    gmaps_sync = googlemaps.Client(key=API_KEY)
-    rescued = 0
-    for idx, (code, lat, lon) in enumerate(coords):
-        if lat is None and lon is None:
-            short_addr, long_addr = addresses[idx][1], addresses[idx][2]
-            c = get_coordinates_sync(gmaps_sync, short_addr)
-            if c.lat is None:
-                c = get_coordinates_sync(gmaps_sync, long_addr)
-            if c.lat is not None:
-                coords[idx] = (code, c.lat, c.lng)
-                rescued += 1
-    print(f"Sync fallback rescued {rescued} practices.")
-
-    # write out Practice_coordinates.parquet
+    # place practices from postcode centroids first, if a lookup file is configured, then
+    # geocode the rest, skipping addresses already in the cache
+    located, failed = await geocode_practices(
+        [PracticeAdd(*a) for a in addresses],
+        API_KEY or "",
+        MAX_CONCURRENT,
+        RETRIES,
+        TARGET_DIR / GEOCODE_CACHE_NAME,
+        Path(POSTCODE_LOOKUP) if POSTCODE_LOOKUP else None,
+        geocoder,
+        MAX_RATE,
+    )
+    write_coordinates(located, failed)
+
+
+def write_coordinates(located: list[PracticeCoords], failed: list[PracticeAdd]) -> None:
+    # write out Practice_coordinates.parquet, with NULL coordinates for failed practices
+    coords: list[tuple[str, float | None, float | None]] = [
+        (c.practice_code, c.lat, c.lon) for c in located
+    ] + [(p.practice_code, None, None) for p in failed]
     with duckdb.connect() as con:
         con.sql("""
             CREATE OR REPLACE TABLE Practice_coordinates (
@@ -193,6 +137,8 @@ async def main():
 
 
 if __name__ == "__main__":
-    if not API_KEY or not TARGET_DIR:
-        raise RuntimeError("Set GOOGLE_MAPS_API_KEY and TARGET_DIRECTORY in .env")
+    if not (API_KEY or POSTCODE_LOOKUP) or not TARGET_DIR:
+        raise RuntimeError(
+            f"Set TARGET_DIRECTORY and GOOGLE_MAPS_API_KEY or {POSTCODE_LOOKUP_ENV} in .env"
+        )
     asyncio.run(main())
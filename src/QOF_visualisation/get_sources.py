@@ -1,10 +1,16 @@
 #!/usr/bin/env -S uv run --script
 
-import io
+import hashlib
 import os
 import shutil
+import tempfile
+import time
 import zipfile
-from pathlib import Path
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fnmatch import fnmatchcase
+from pathlib import Path, PurePosixPath
+from typing import IO
 
 import duckdb
 import requests
@@ -14,7 +20,15 @@ from requests.adapters import HTTPAdapter
 from requests.models import Response
 from urllib3.util.retry import Retry
 
-from QOF_visualisation.csv_to_parquet import csv_to_parquet
+from QOF_visualisation.csv_to_parquet import (
+    ACHIEVEMENT_PROFILE,
+    DEFAULT_CONVERT_WORKERS,
+    DEFAULT_DUCKDB_MEMORY_LIMIT,
+    DEFAULT_DUCKDB_THREADS,
+    ConversionJob,
+    convert_all,
+)
+from QOF_visualisation.download_cache import CacheEntry, DownloadCache
 
 # Dict of QOF year csv zip urls.
 source_url_dict: dict[str, str] = {
@@ -27,6 +41,21 @@ source_url_dict: dict[str, str] = {
     "location_info": "https://files.digital.nhs.uk/assets/ods/current/epraccur.zip",
 }
 
+# Size of each chunk written to disk while streaming a download.
+CHUNK_SIZE: int = 1024 * 1024
+
+# Number of sources downloaded at once. Can be overridden with DOWNLOAD_WORKERS in .env.
+DEFAULT_DOWNLOAD_WORKERS: int = 4
+
+# Hive-partitioned dataset, partitioned by reporting_year, that holds every QOF year's achievement.
+ACHIEVEMENT_DATASET: str = "achievement"
+
+# Source archive hash of each QOF year, read by the incremental dbt models to find changed years.
+ACHIEVEMENT_MANIFEST: str = "achievement_manifest.parquet"
+
+# File in the target directory recording the validators of each downloaded archive.
+DOWNLOAD_CACHE_NAME: str = ".download_cache.json"
+
 pattern_dict = {
     "achievement": "ACHIEVEMENT_*.csv",
     "nhs_organisations": "MAPPING_NHS_GEOGRAPHIES_*.csv",
@@ -36,8 +65,17 @@ pattern_dict = {
 }
 
 
-def get_with_retry(url: str, retries: int = 5, backoff: float = 0.5) -> requests.Response:
-    """Download files using requests and a sequential backoff to avoid timeout/DNS issues."""
+def get_with_retry(
+    url: str,
+    retries: int = 5,
+    backoff: float = 0.5,
+    stream: bool = False,
+    headers: dict[str, str] | None = None,
+) -> requests.Response:
+    """Download files using requests and a sequential backoff to avoid timeout/DNS issues.
+
+    With stream=True the body is not read up front; iterate over it with iter_content.
+    """
     session: requests.Session = requests.Session()
     retry: Retry = Retry(
         total=retries,
@@ -50,32 +88,203 @@ def get_with_retry(url: str, retries: int = 5, backoff: float = 0.5) -> requests
     session.mount("https://", adapter)
     session.mount("http://", adapter)
 
-    return session.get(url, timeout=10)
+    return session.get(url, timeout=10, stream=stream, headers=headers)
+
+
+def _write_to_tempfile(resp: Response, chunk_size: int) -> tuple[IO[bytes], str]:
+    """Write a streamed response body to an anonymous temporary file, hashing it as it goes."""
+    tmp_file: IO[bytes] = tempfile.TemporaryFile()
+    digest = hashlib.sha256()
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            tmp_file.write(chunk)
+            digest.update(chunk)
+    except BaseException:
+        tmp_file.close()
+        raise
+
+    tmp_file.seek(0)
+    return tmp_file, digest.hexdigest()
+
+
+def download_to_tempfile(url: str, chunk_size: int = CHUNK_SIZE) -> IO[bytes]:
+    """
+    Stream a download to an anonymous temporary file.
+
+    The body is written to disk in chunks, so memory use does not grow with the file size.
+    Returns the open file, rewound to the start. It is deleted when closed.
+    """
+    resp: Response
+    with get_with_retry(url, stream=True) as resp:
+        resp.raise_for_status()
+        tmp_file, _ = _write_to_tempfile(resp, chunk_size)
+    return tmp_file
 
 
-def download_and_extract_zip(target_dir: Path, url: str) -> Path:
-    """Dowload and extract a zip folder to the target directory."""
-    resp: Response = get_with_retry(url)
-    resp.raise_for_status()
+def download_if_changed(
+    url: str, cache: DownloadCache, chunk_size: int = CHUNK_SIZE
+) -> IO[bytes] | None:
+    """
+    Stream a download to a temporary file unless it is unchanged since the cached download.
+
+    Sends a conditional GET using the cached ETag/Last-Modified. Returns None if the server answers
+    304 Not Modified, or if the body has the same SHA-256 as last time.
+    """
+    resp: Response
+    with get_with_retry(url, stream=True, headers=cache.conditional_headers(url)) as resp:
+        if resp.status_code == 304:
+            return None
+        resp.raise_for_status()
+        tmp_file, sha256 = _write_to_tempfile(resp, chunk_size)
+        entry = CacheEntry(resp.headers.get("ETag"), resp.headers.get("Last-Modified"), sha256)
+
+    if not cache.record(url, entry):
+        tmp_file.close()
+        return None
+    return tmp_file
+
+
+def extract_matching(z: zipfile.ZipFile, target_dir: Path, patterns: Iterable[str]) -> list[Path]:
+    """
+    Extract only the archive members whose file name matches one of the patterns.
+
+    .txt members are written with a .csv suffix, and patterns are matched against that name.
+    Members are copied in chunks, and unsafe paths (absolute or containing "..") are skipped.
+    Returns the paths of the extracted files.
+    """
+    patterns = list(patterns)
+    extracted: list[Path] = []
+    for info in z.infolist():
+        member: PurePosixPath = PurePosixPath(info.filename)
+        if info.is_dir() or member.is_absolute() or ".." in member.parts:
+            continue
+        if member.suffix == ".txt":
+            member = member.with_suffix(".csv")
+        if not any(fnmatchcase(member.name, pattern) for pattern in patterns):
+            continue
+
+        out_path: Path = target_dir.joinpath(*member.parts)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with z.open(info) as src, out_path.open("wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        extracted.append(out_path)
+
+    return extracted
+
+
+def download_and_extract_zip(
+    target_dir: Path,
+    url: str,
+    cache: DownloadCache | None = None,
+    patterns: Iterable[str] = pattern_dict.values(),
+) -> Path | None:
+    """
+    Dowload a zip folder and extract the files matching patterns to the target directory.
 
-    with zipfile.ZipFile(io.BytesIO(resp.content)) as z:
+    Members that no pattern matches are never written to disk.
+    With a cache, returns None without extracting anything if the archive is unchanged.
+    """
+    archive: IO[bytes] | None = (
+        download_if_changed(url, cache) if cache else download_to_tempfile(url)
+    )
+    if archive is None:
+        return None
+
+    with archive, zipfile.ZipFile(archive) as z:
         if target_dir.exists():
             if target_dir.is_file():
                 target_dir.unlink()
             else:
                 shutil.rmtree(target_dir)
-        z.extractall(target_dir)
+        target_dir.mkdir(parents=True)
+        extracted: list[Path] = extract_matching(z, target_dir, patterns)
+        print(f"Extracted {len(extracted)} of {len(z.infolist())} files from {url}")
 
-    # Change .txt files to csv files.
-    for txt_file in target_dir.rglob("*.txt"):
-        txt_file.rename(txt_file.with_suffix(".csv"))
+    return target_dir
 
-    # Re-encode CSV files to UTF-8
-    for csv_file in target_dir.rglob("*.csv"):
-        csv_content: str = csv_file.read_text(encoding="latin1")
-        csv_file.write_text(csv_content, encoding="utf-8")
 
-    return target_dir
+def download_sources(
+    target_dir: Path,
+    url_dict: dict[str, str],
+    max_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    cache: DownloadCache | None = None,
+) -> dict[str, Path | None]:
+    """
+    Download and extract each source concurrently, at most max_workers at a time.
+
+    Each source goes through download_and_extract_zip, so keeps the retry policy of get_with_retry.
+    Progress and the time taken are printed as each source finishes.
+    Returns a dict of source name to extracted directory, in the order of url_dict.
+    With a cache, sources that are unchanged since the last download map to None.
+    """
+
+    def timed_download(name: str, url: str) -> tuple[Path | None, float]:
+        start: float = time.perf_counter()
+        path: Path | None = download_and_extract_zip(target_dir / name, url, cache)
+        return path, time.perf_counter() - start
+
+    start: float = time.perf_counter()
+    source_dirs: dict[str, Path | None] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(timed_download, name, url): name for name, url in url_dict.items()}
+        for future in as_completed(futures):
+            name: str = futures[future]
+            source_dirs[name], seconds = future.result()
+            status: str = "Unchanged" if source_dirs[name] is None else "Downloaded"
+            print(f"[{len(source_dirs)}/{len(futures)}] {status} {name} in {seconds:.1f}s")
+
+    changed: int = sum(path is not None for path in source_dirs.values())
+    print(
+        f"Checked {len(source_dirs)} sources, {changed} changed, "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return {name: source_dirs[name] for name in url_dict}
+
+
+def achievement_partition(name: str) -> str:
+    """Return the hive partition of a QOF year source, e.g. reporting_year=2024 for 2023-2024."""
+    return f"reporting_year={name[-4:]}"
+
+
+def parquet_paths(target_dir: Path, name: str) -> list[Path]:
+    """Return the parquet files main creates from a source."""
+    if name.startswith("achievement"):
+        return [
+            target_dir / ACHIEVEMENT_DATASET / achievement_partition(name) / "data_0.parquet",
+            target_dir / f"structures_{name[-9:]}.parquet",
+            target_dir / f"qof_indicators_{name[-9:]}.parquet",
+        ]
+    return [target_dir / f"{name}.parquet"]
+
+
+def write_achievement_manifest(
+    conn: DuckDBPyConnection, target_dir: Path, cache: DownloadCache
+) -> Path:
+    """
+    Write the reporting year and source archive SHA-256 of every QOF year to a parquet file.
+
+    The incremental dbt models compare these hashes with the ones they last processed,
+    and rebuild only the years that differ.
+    """
+    rows: list[tuple[int, str]] = []
+    for name, url in source_url_dict.items():
+        entry: CacheEntry | None = cache.get(url)
+        if name.startswith("achievement") and entry is not None:
+            rows.append((int(name[-4:]), entry.sha256))
+
+    manifest_path: Path = target_dir / ACHIEVEMENT_MANIFEST
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "CREATE OR REPLACE TEMP TABLE achievement_manifest "
+            "(reporting_year BIGINT, source_sha256 VARCHAR)"
+        )
+        # executemany rejects an empty parameter list; an empty manifest leaves dbt to
+        # build every year on a full refresh and keep the existing years incrementally
+        if rows:
+            cursor.executemany("INSERT INTO achievement_manifest VALUES (?, ?)", rows)
+        quoted_path: str = str(manifest_path).replace("'", "''")
+        cursor.execute(f"COPY achievement_manifest TO '{quoted_path}' (FORMAT parquet)")
+    return manifest_path
 
 
 def assign_target_directory() -> Path:
@@ -107,51 +316,82 @@ def main() -> None:
     target_dir: Path = assign_target_directory()
     conn: DuckDBPyConnection = duckdb.connect()
 
-    # Download sources and store csv paths in a dict.
+    # Sources with missing parquet files are downloaded unconditionally.
+    cache: DownloadCache = DownloadCache(target_dir / DOWNLOAD_CACHE_NAME)
+    for name, url in source_url_dict.items():
+        if not all(path.exists() for path in parquet_paths(target_dir, name)):
+            cache.forget(url)
+
+    # Download changed sources concurrently and store their csv paths in a dict.
+    max_workers: int = int(os.getenv("DOWNLOAD_WORKERS", DEFAULT_DOWNLOAD_WORKERS))
+    downloaded: dict[str, Path | None] = download_sources(
+        target_dir, source_url_dict, max_workers, cache
+    )
     source_csv_dict: dict[str, Path] = {
-        name: download_and_extract_zip(target_dir / name, url)
-        for name, url in source_url_dict.items()
+        name: path for name, path in downloaded.items() if path is not None
     }
 
-    # Initialize parquet dict.
-    souce_parquet_dict: dict[str, Path] = {}
+    # Initialize conversion job list.
+    jobs: list[ConversionJob] = []
 
-    # Create qof dir list then convert required files to parquet.
+    # Create qof dir list then queue the required files for conversion to parquet.
     qof_name_list: list[str] = [
         name for name in source_csv_dict.keys() if name.startswith("achievement")
     ]
     for name in qof_name_list:
-        # Convert achievement files.
-        souce_parquet_dict[name] = csv_to_parquet(
-            conn, source_csv_dict[name], pattern_dict["achievement"]
+        # Convert achievement files into their year's partition of the achievement dataset.
+        jobs.append(
+            ConversionJob(
+                source_csv_dict[name],
+                pattern_dict["achievement"],
+                ACHIEVEMENT_DATASET,
+                ACHIEVEMENT_PROFILE,
+                achievement_partition(name),
+            )
         )
 
         # Convert nhs organisation files.
         nhs_organisations_name = "structures_" + name[-9:]
-        souce_parquet_dict[nhs_organisations_name] = csv_to_parquet(
-            conn, source_csv_dict[name], pattern_dict["nhs_organisations"], nhs_organisations_name
+        jobs.append(
+            ConversionJob(
+                source_csv_dict[name], pattern_dict["nhs_organisations"], nhs_organisations_name
+            )
         )
 
         # Convert qof indicator files.
         qof_indicators_name = "qof_indicators_" + name[-9:]
-        souce_parquet_dict[qof_indicators_name] = csv_to_parquet(
-            conn, source_csv_dict[name], pattern_dict["qof_indicators"], qof_indicators_name
+        jobs.append(
+            ConversionJob(
+                source_csv_dict[name], pattern_dict["qof_indicators"], qof_indicators_name
+            )
         )
 
     # Convert pcd_reference_set file.
-    souce_parquet_dict["reference_set"] = csv_to_parquet(
-        conn, source_csv_dict["reference_set"], pattern_dict["reference_set"]
-    )
+    if "reference_set" in source_csv_dict:
+        jobs.append(ConversionJob(source_csv_dict["reference_set"], pattern_dict["reference_set"]))
 
     # Convert gp_location_info file.
-    souce_parquet_dict["location_info"] = csv_to_parquet(
-        conn, source_csv_dict["location_info"], pattern_dict["location_info"]
+    if "location_info" in source_csv_dict:
+        jobs.append(ConversionJob(source_csv_dict["location_info"], pattern_dict["location_info"]))
+
+    # Run the conversions concurrently on the shared connection.
+    souce_parquet_list: list[Path] = convert_all(
+        conn,
+        jobs,
+        max_workers=int(os.getenv("CONVERT_WORKERS", DEFAULT_CONVERT_WORKERS)),
+        threads=int(os.getenv("DUCKDB_THREADS", DEFAULT_DUCKDB_THREADS)),
+        memory_limit=os.getenv("DUCKDB_MEMORY_LIMIT", DEFAULT_DUCKDB_MEMORY_LIMIT),
     )
+    print(f"Converted {len(souce_parquet_list)} files to parquet")
 
     # Clean up csv files.
     for path in source_csv_dict.values():
         shutil.rmtree(path)
 
+    # Record the downloads only once their conversions have succeeded.
+    write_achievement_manifest(conn, target_dir, cache)
+    cache.save()
+
 
 if __name__ == "__main__":
     main()
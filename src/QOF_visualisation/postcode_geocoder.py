@@ -0,0 +1,129 @@
+"""
+Offline geocoding of practices from postcode centroids.
+
+Loads a postcode lookup file (CSV or parquet, e.g. the ONS Postcode Directory or the free
+ukpostcodes.csv) into a DuckDB table keyed on the normalized postcode, then places every
+practice with a single join. No network or API key is needed; practices whose postcode is not
+in the lookup are returned for the HTTP geocoder to resolve.
+"""
+
+import re
+from pathlib import Path
+
+import duckdb
+import httpx
+
+from QOF_visualisation.coord_dataclasses import PracticeAdd, PracticeCoords
+from QOF_visualisation.geocoders import OK, ZERO_RESULTS, GeocodeResult
+
+# Environment variable naming the postcode lookup file
+POSTCODE_LOOKUP_ENV: str = "POSTCODE_LOOKUP"
+
+# A UK postcode at the end of an address, e.g. "..., LS1 4AP"
+POSTCODE_PATTERN: str = r"([A-Za-z]{1,2}[0-9][A-Za-z0-9]? ?[0-9][A-Za-z]{2})\s*$"
+
+
+def extract_postcode(address: str) -> str | None:
+    """Return the postcode ending an address in its standard form, e.g. "LS1 4AP"."""
+    match: re.Match[str] | None = re.search(POSTCODE_PATTERN, address)
+    if match is None:
+        return None
+    postcode: str = match.group(1).replace(" ", "").upper()
+    return f"{postcode[:-3]} {postcode[-3:]}"
+
+
+class PostcodeGeocoder:
+    """Postcode to centroid lookup held in an in-memory DuckDB table.
+
+    locate() places a whole practice list in one join. geocode() implements the Geocoder
+    protocol for single addresses; the session is unused.
+    """
+
+    def __init__(
+        self,
+        lookup_path: Path,
+        postcode_column: str = "postcode",
+        lat_column: str = "latitude",
+        lng_column: str = "longitude",
+    ) -> None:
+        self.conn: duckdb.DuckDBPyConnection = duckdb.connect()
+        self.conn.execute("""
+            create table postcode_centroids (
+                postcode_key varchar primary key,
+                lat double,
+                lng double
+            )
+        """)
+        # Terminated postcodes are listed with placeholder coordinates outside the valid range
+        self.conn.execute(f"""
+            insert into postcode_centroids
+            select
+                upper(replace("{postcode_column}", ' ', '')) as postcode_key,
+                any_value("{lat_column}")::double as lat,
+                any_value("{lng_column}")::double as lng
+            from '{lookup_path}'
+            where "{lat_column}"::double between -90 and 90
+            and "{lng_column}"::double between -180 and 180
+            group by postcode_key
+        """)
+        count = self.conn.sql("select count(*) from postcode_centroids").fetchone()
+        print(f"Loaded {count[0] if count else 0} postcode centroids from {lookup_path}")
+
+    def locate(
+        self, practice_list: list[PracticeAdd]
+    ) -> tuple[list[PracticeCoords], list[PracticeAdd]]:
+        """Place practices at the centroid of the postcode ending their short address.
+
+        Returns the located practices and those whose postcode was missing or not found.
+        """
+        if not practice_list:
+            return [], []
+        rows = self.conn.execute(
+            f"""
+            with practices as (
+                select
+                    unnest($idx) as idx,
+                    upper(replace(
+                        regexp_extract(unnest($addresses), '{POSTCODE_PATTERN}', 1), ' ', ''
+                    )) as postcode_key
+            )
+            select practices.idx, postcode_centroids.lat, postcode_centroids.lng
+            from practices
+            left join postcode_centroids
+                on practices.postcode_key = postcode_centroids.postcode_key
+            order by practices.idx
+            """,
+            {
+                "idx": list(range(len(practice_list))),
+                "addresses": [p_add.short_addr for p_add in practice_list],
+            },
+        ).fetchall()
+
+        located: list[PracticeCoords] = []
+        unmatched: list[PracticeAdd] = []
+        for idx, lat, lng in rows:
+            p_add: PracticeAdd = practice_list[idx]
+            if lat is None:
+                unmatched.append(p_add)
+            else:
+                located.append(PracticeCoords(p_add.practice_code, lat, lng))
+        return located, unmatched
+
+    async def geocode(self, session: httpx.AsyncClient, address: str) -> GeocodeResult:
+        """Geocoder protocol: place one address at the centroid of its trailing postcode."""
+        row = self.conn.execute(
+            f"""
+            select lat, lng
+            from postcode_centroids
+            where postcode_key = upper(replace(
+                regexp_extract($address, '{POSTCODE_PATTERN}', 1), ' ', ''
+            ))
+            """,
+            {"address": address},
+        ).fetchone()
+        if row is None:
+            return GeocodeResult(ZERO_RESULTS)
+        return GeocodeResult(OK, row[0], row[1])
+
+    def close(self) -> None:
+        self.conn.close()
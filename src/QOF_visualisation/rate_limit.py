@@ -0,0 +1,161 @@
+"""
+Rate limiting for the async geocoding pipeline.
+
+AdaptiveLimiter combines a token bucket, which caps the request rate at the API quota, with a
+concurrency limit adjusted AIMD-style: it grows by about one slot per round trip while requests
+succeed quickly, and halves when the API reports OVER_QUERY_LIMIT or latency climbs well above
+the fastest observed. Large runs then settle at the highest throughput the quota allows.
+
+Typical usage example:
+    limiter = AdaptiveLimiter(rate=50, max_concurrent=20)
+    async with limiter.slot() as slot:
+        result = await geocoder.geocode(session, address)
+        slot.status = result.status
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from QOF_visualisation.geocoders import OVER_QUERY_LIMIT
+
+# Default request rate, the Google Geocoding API's per-second quota
+DEFAULT_RATE: float = 50.0
+
+# Latency above this multiple of the fastest observed counts as congestion
+LATENCY_TOLERANCE: float = 3.0
+
+# Growth of the latency baseline per request
+BASELINE_DRIFT: float = 1.01
+
+# Backoff before retrying a request, in seconds
+BACKOFF_BASE: float = 0.1
+BACKOFF_CAP: float = 10.0
+
+
+def backoff_delay(attempt: int, status: str | None = None) -> float:
+    """Exponential backoff with full jitter. Quota errors back off from a larger base."""
+    base: float = BACKOFF_BASE * 10 if status == OVER_QUERY_LIMIT else BACKOFF_BASE
+    return random.uniform(0, min(BACKOFF_CAP, base * 2**attempt))
+
+
+class TokenBucket:
+    """Allows rate acquisitions per second on average, and bursts of up to capacity."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity is not None else max(1.0, rate / 10)
+        self._tokens: float = self.capacity
+        self._updated: float = time.monotonic()
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait for a token. Waiters are served in arrival order."""
+        async with self._lock:
+            while True:
+                now: float = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class Slot:
+    """One request's hold on the limiter. Set status to the outcome before releasing it."""
+
+    status: str | None = None
+
+
+@dataclass
+class LimiterStats:
+    """Counters describing how the limiter adapted.
+
+    Attributes:
+        requests: Requests made through the limiter
+        quota_errors: Requests answered with OVER_QUERY_LIMIT
+        decreases: Times the concurrency limit was cut
+        limit: Current concurrency limit
+        min_latency: Fastest request seen, in seconds
+    """
+
+    requests: int = 0
+    quota_errors: int = 0
+    decreases: int = 0
+    limit: float = 0.0
+    min_latency: float = 0.0
+
+
+class AdaptiveLimiter:
+    """Token bucket plus an AIMD concurrency limit, shared by all requests of a run."""
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        max_concurrent: int = 10,
+        min_concurrent: int = 1,
+        initial_concurrent: int | None = None,
+    ) -> None:
+        self.bucket: TokenBucket = TokenBucket(rate)
+        self.max_concurrent: int = max_concurrent
+        self.min_concurrent: int = min_concurrent
+        self.limit: float = float(initial_concurrent or max(min_concurrent, max_concurrent // 2))
+        self._in_flight: int = 0
+        self._min_latency: float | None = None
+        self._last_decrease: float = 0.0
+        self._stats: LimiterStats = LimiterStats()
+        self._cond: asyncio.Condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        """Hold a concurrency slot and a token for the duration of one request."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+        slot = Slot()
+        start: float | None = None
+        try:
+            await self.bucket.acquire()
+            start = time.monotonic()
+            yield slot
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                if start is not None:
+                    self._record(time.monotonic() - start, slot.status)
+                self._cond.notify_all()
+
+    def _record(self, latency: float, status: str | None) -> None:
+        """Adjust the concurrency limit after a request. Caller holds the condition."""
+        self._stats.requests += 1
+        # The baseline drifts up slowly, so one unusually fast response does not stick
+        if self._min_latency is None:
+            self._min_latency = latency
+        self._min_latency = min(latency, self._min_latency * BASELINE_DRIFT)
+
+        congested: bool = latency > self._min_latency * LATENCY_TOLERANCE
+        if status == OVER_QUERY_LIMIT:
+            self._stats.quota_errors += 1
+        if status == OVER_QUERY_LIMIT or congested:
+            # Cut at most once per round trip, so one burst of errors counts once
+            now: float = time.monotonic()
+            if now - self._last_decrease > latency:
+                self.limit = max(float(self.min_concurrent), self.limit / 2)
+                self._last_decrease = now
+                self._stats.decreases += 1
+        else:
+            self.limit = min(float(self.max_concurrent), self.limit + 1 / self.limit)
+
+    def stats(self) -> LimiterStats:
+        return LimiterStats(
+            requests=self._stats.requests,
+            quota_errors=self._stats.quota_errors,
+            decreases=self._stats.decreases,
+            limit=self.limit,
+            min_latency=self._min_latency or 0.0,
+        )
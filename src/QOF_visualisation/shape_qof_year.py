@@ -1,13 +1,12 @@
-import io
 import shutil
 import tempfile
 import zipfile
 from pathlib import Path
 
 import duckdb
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from QOF_visualisation.csv_to_parquet import SOURCE_ENCODING
+from QOF_visualisation.get_sources import download_to_tempfile
 
 # Dict of QOF year csv zip urls.
 raw_qof_path_dict: dict[str, str] = {
@@ -25,22 +24,6 @@ supplementary_url_dict: dict[str, str] = {
 }
 
 
-def get_with_retry(url: str, retries: int = 5, backoff: float = 0.5) -> requests.Response:
-    session = requests.Session()
-    retry = Retry(
-        total=retries,
-        backoff_factor=backoff,  # Waits: 0.5s, 1s, 2s, etc.
-        status_forcelist=[500, 502, 503, 504],
-        allowed_methods=["GET"],
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
-
-    return session.get(url, timeout=10)
-
-
 def create_practice_geographical_list(
     address_csv: Path, gp_list_csv_list: list[Path], tmpdirname: str
 ) -> Path:
@@ -62,8 +45,10 @@ def create_practice_geographical_list(
                     a.column06.lower(), a.column07.lower(), a.column09
                 ) AS long_address,
                 a.column17 AS telephone_no
-            FROM read_csv({csv_paths}, sample_size = -1, union_by_name = true) l
-            LEFT JOIN (FROM '{address_csv}') a
+            FROM read_csv(
+                {csv_paths}, sample_size = -1, union_by_name = true, encoding = '{SOURCE_ENCODING}'
+            ) l
+            LEFT JOIN (FROM read_csv('{address_csv}', encoding = '{SOURCE_ENCODING}')) a
               ON l.practice_code = a.column00
         ) TO '{output_path}' (FORMAT PARQUET)
         """)
@@ -77,21 +62,22 @@ def shape_QOF_data(directory_path: Path, PCD_dir: Path):
     mapping_indicators = directory_path / "MAPPING_INDICATORS_*.csv"
     output_descriptions = PCD_dir / "20241205_PCD_Output_Descriptions.txt"
     pivot_query: str = f"""
-    from '{achievement}'
+    from read_csv('{achievement}', encoding = '{SOURCE_ENCODING}')
     select
-        * exclude (MEASURE, "VALUE"), 
-        MAX(case when MEASURE = 'NUMERATOR' then "VALUE" else NULL end) as NUMERATOR,
-        MAX(case when MEASURE = 'DENOMINATOR' then "VALUE" else NULL end) as DENOMINATOR,
-        MAX(case when MEASURE = 'REGISTER' then "VALUE" else NULL end) as REGISTER,
-        MAX(case when MEASURE = 'ACHIEVED_POINTS' then "VALUE" else NULL end) as ACHIEVED_POINTS
-    group by all;
+        PRACTICE_CODE,
+        INDICATOR_CODE,
+        MAX("VALUE") filter (where MEASURE = 'NUMERATOR') as NUMERATOR,
+        MAX("VALUE") filter (where MEASURE = 'DENOMINATOR') as DENOMINATOR,
+        MAX("VALUE") filter (where MEASURE = 'REGISTER') as REGISTER,
+        MAX("VALUE") filter (where MEASURE = 'ACHIEVED_POINTS') as ACHIEVED_POINTS
+    group by PRACTICE_CODE, INDICATOR_CODE;
     """
 
     percent_achieved_query: str = f"""
     from "pivot" p
-    left join (from '{mapping_indicators}') i
+    left join (from read_csv('{mapping_indicators}', encoding = '{SOURCE_ENCODING}')) i
     on p.INDICATOR_CODE = i.INDICATOR_CODE
-    left join (from read_csv('{output_descriptions}')) d
+    left join (from read_csv('{output_descriptions}', encoding = '{SOURCE_ENCODING}')) d
     on p.INDICATOR_CODE = d.Output_ID
     select
         p.Practice_code,
@@ -121,12 +107,9 @@ def shape_QOF_data(directory_path: Path, PCD_dir: Path):
 
 def download_and_extract_zip(dir_name: str, url: str, tmpdirname: str) -> Path:
     print(f"Downloading: {url}")
-    resp = get_with_retry(url)
-    resp.raise_for_status()
-
     tp = Path(tmpdirname) / dir_name
 
-    with zipfile.ZipFile(io.BytesIO(resp.content)) as z:
+    with download_to_tempfile(url) as archive, zipfile.ZipFile(archive) as z:
         if tp.exists():
             if tp.is_file():
                 tp.unlink()
@@ -134,11 +117,6 @@ def download_and_extract_zip(dir_name: str, url: str, tmpdirname: str) -> Path:
                 shutil.rmtree(tp)
         z.extractall(tp)
 
-    # Re-encode CSV files to UTF-8
-    for csv_file in tp.rglob("*.csv"):
-        content = csv_file.read_text(encoding="latin1")
-        csv_file.write_text(content, encoding="utf-8")
-
     return tp
 
 
@@ -16,40 +16,53 @@ The module uses a modular architecture with components organized into:
 - Helper utilities (text formatting)
 
 Typical usage:
-    app = dash.Dash(__name__)
-    app.layout = create_app_layout(DEFAULT_YEAR, DEFAULT_IND)
-    app.run_server()
+    app = create_app()
+    app.run()
+
+Set QOF_CLIENTSIDE_FILTERING=1 to load each indicator/year/level slice into the
+browser once and apply the achievement bucket there, without a server round trip.
+
+Under gunicorn, serve the module-level WSGI server:
+    gunicorn QOF_visualisation.visualization.app:server
+
+Do not use --preload: Polars' thread pool does not survive a fork, so workers
+forked from a master that has built the layout deadlock on their first query.
+Each worker builds the startup data on its first request; set
+QOF_STARTUP_SNAPSHOT so that, once one worker has built it, the others load it
+from that file instead.
 """
 
+import os
+from typing import Any, Final
+
 import dash
-import plotly.graph_objects as go
 import polars as pl
-from dash import Input, Output, State, ctx, dcc
+from dash import ClientsideFunction, Input, Output, Patch, State, ctx, dcc, html
 
 # Import application components
 from QOF_visualisation.visualization.constants import BUCKET_SQL, DEFAULT_BUCKET, ORG_TABLE
 from QOF_visualisation.visualization.data_queries import (
-    check_bucket_has_data,
     get_achievement_by_org_level,
-    get_available_indicators,
-    get_indicators_by_year,
-    get_national_achievement_data,
-    get_org_achievement_data,
+    get_achievement_slice,
+    get_bucket_counts,
+    get_long_achievement_data,
+    get_long_national_achievement_data,
 )
 from QOF_visualisation.visualization.layout_components import create_app_layout
+from QOF_visualisation.visualization.startup_cache import get_startup_data
 from QOF_visualisation.visualization.state_management import select_bucket_value
 from QOF_visualisation.visualization.text_utils import md_wrap
 from QOF_visualisation.visualization.visualization_utils import (
-    create_bar_chart,
-    create_blank_bar,
-    create_blank_map,
-    create_map,
+    create_map_store,
+    patch_bar_chart,
+    patch_blank_bar,
+    patch_blank_map,
+    patch_map,
 )
-from QOF_visualisation.visualization.db_connection import query
 
 # Type definitions for component options
 DropdownOption = dict[str, str | int | bool | None]
-ClickPoint = dict[str, list[str | float] | list[dict[str, str | float]]]
+ClickPoint = dict[str, str | float | list[str | float] | list[dict[str, str | float]]]
 
 # Import type from state_management
 from QOF_visualisation.visualization.state_management import BucketOption
@@ -59,31 +72,16 @@ DropdownOptions = list[DropdownOption]
 BucketOptions = list[BucketOption]
 ClickData = dict[str, list[ClickPoint]]
 
-# Initialize application
-app = dash.Dash(__name__)
-
-# Get initial data
-ALL_YEARS, ALL_INDS = get_available_indicators()
+# Filter achievement buckets in the browser instead of re-querying on each change
+CLIENTSIDE_FILTERING: Final[bool] = os.getenv("QOF_CLIENTSIDE_FILTERING", "") not in ("", "0")
 
-# Set default selections
-DEFAULT_IND = ALL_INDS[0] if ALL_INDS else None
-DEFAULT_YEAR = ALL_YEARS[-1] if ALL_YEARS else None
 
-# Configure application layout
-app.layout = create_app_layout(DEFAULT_YEAR, DEFAULT_IND)
+def serve_layout() -> html.Div:
+    """Build the page layout, loading startup data on the first page view."""
+    startup = get_startup_data()
+    return create_app_layout(startup.default_year, startup.default_indicator)
 
 
-@app.callback(
-    Output("ind", "options"),
-    Output("ind", "value"),
-    Output("yr", "options"),
-    Output("yr", "value"),
-    Output("bucket", "options"),
-    Output("bucket", "value"),
-    Input("ind", "value"),
-    Input("yr", "value"),
-    Input("level", "value"),
-)
 def sync_dropdowns(
     ind_val: str | None, yr_val: int | None, level_val: str | None
 ) -> tuple[DropdownOptions, str | None, DropdownOptions, int | None, BucketOptions, str | None]:
@@ -105,28 +103,29 @@ def sync_dropdowns(
         """Create a dropdown option from a value."""
         return {"label": str(value), "value": value, "disabled": None}
 
+    startup = get_startup_data()
+
     # Get indicator options based on year selection
     if yr_val is not None:
-        valid_ind = get_indicators_by_year(yr_val)
+        valid_ind = startup.codes_by_year.get(int(yr_val), [])
         ind_opts = list(map(make_dropdown_opt, valid_ind))
         ind_val = ind_val if ind_val in valid_ind else (valid_ind[0] if valid_ind else None)
     else:
-        ind_opts = list(map(make_dropdown_opt, ALL_INDS))
-        ind_val = ind_val if ind_val in ALL_INDS else (ALL_INDS[0] if ALL_INDS else None)
-
-    yr_opts = list(map(make_dropdown_opt, ALL_YEARS))
+        all_inds = startup.indicators
+        ind_opts = list(map(make_dropdown_opt, all_inds))
+        ind_val = ind_val if ind_val in all_inds else (all_inds[0] if all_inds else None)
 
     # Generate year options
-    yr_opts = list(map(make_dropdown_opt, ALL_YEARS))
+    yr_opts = list(map(make_dropdown_opt, startup.years))
 
     # Configure bucket options
-    table = ORG_TABLE.get(level_val or "Practice", "qof_vis.fct__practice_achievement")
+    level = level_val if level_val in ORG_TABLE else "Practice"
     bucket_opts: list[BucketOption] = []
 
     if ind_val is not None and yr_val is not None:
-        for label, cond in BUCKET_SQL.items():
-            has_data = check_bucket_has_data(table, ind_val, yr_val, cond)
-            bucket_opts.append(BucketOption(label=label, value=label, disabled=not has_data))
+        counts = get_bucket_counts(level, ind_val, yr_val)
+        for label, n in counts.items():
+            bucket_opts.append(BucketOption(label=label, value=label, disabled=n == 0))
     else:
         bucket_opts = [BucketOption(label=k, value=k, disabled=True) for k in BUCKET_SQL]
 
@@ -140,19 +139,14 @@ def sync_dropdowns(
     return ind_opts, ind_val, yr_opts, yr_val, bucket_opts, selected_bucket
 
 
-@app.callback(
-    Output("map", "figure"),
-    Output("desc", "children"),
-    Input("ind", "value"),
-    Input("yr", "value"),
-    Input("level", "value"),
-    Input("bucket", "value"),
-)
 def update_map(
     indic: str | None, yr: int | None, level: str | None, bucket: str | None
-) -> tuple[go.Figure, dcc.Markdown | None]:
+) -> tuple[Patch, dcc.Markdown | None]:
     """Update map visualization based on selected filters.
 
+    The map figure is created once by the layout; this sends only the new
+    marker data as a partial update.
+
     Args:
         indic: Selected indicator code
         yr: Selected year
@@ -161,83 +155,77 @@ def update_map(
 
     Returns:
         A tuple containing:
-        - The map figure
+        - A patch replacing the map's marker data
         - The indicator description as markdown, or None if no data
     """
     if indic is None or yr is None or bucket is None or level is None:
-        return create_blank_map(), None
+        return patch_blank_map(), None
 
     # Get data for selected filters
     table_name = ORG_TABLE.get(level, "qof_vis.fct__practice_achievement")
-    df = get_achievement_by_org_level(table_name, indic, yr, BUCKET_SQL[bucket])
+    df = get_achievement_by_org_level(table_name, indic, yr, bucket)
 
     if df.is_empty():
-        return create_blank_map(), None
+        return patch_blank_map(), None
 
-    # Create visualization
-    fig = create_map(df)
-    descr_val = df["descr"][0] if df.height > 0 else ""
+    descr_val = df["descr"][0]
+    return patch_map(df), dcc.Markdown(md_wrap(str(descr_val)))
 
-    return fig, dcc.Markdown(md_wrap(str(descr_val)))
+
+def load_map_data(
+    indic: str | None, yr: int | None, level: str | None
+) -> tuple[dict[str, Any] | None, dcc.Markdown | None]:
+    """Load every bucket of the selected slice for client-side filtering.
+
+    Args:
+        indic: Selected indicator code
+        yr: Selected year
+        level: Selected organization level
+
+    Returns:
+        A tuple containing:
+        - The map store consumed by the filter_map clientside callback
+        - The indicator description as markdown, or None if no data
+    """
+    if indic is None or yr is None or level is None:
+        return None, None
+
+    table_name = ORG_TABLE.get(level, "qof_vis.fct__practice_achievement")
+    df = get_achievement_slice(table_name, indic, yr)
+    if df.is_empty():
+        return create_map_store(df), None
+
+    return create_map_store(df), dcc.Markdown(md_wrap(str(df["descr"][0])))
 
 
-@app.callback(
-    Output("bars", "figure"),
-    Input("map", "clickData"),
-    State("ind", "value"),
-    State("yr", "value"),
-    State("level", "value"),
-)
 def update_bars(
     click: ClickData | None, indic: str | None, yr: int | None, level: str | None
-) -> go.Figure:
-    """Update bar chart based on selected organization."""
+) -> Patch:
+    """Update bar chart based on selected organization.
+
+    The bar chart is created once by the layout; this sends only the new bars
+    and title as a partial update.
+    """
     if not click or indic is None or yr is None or level is None:
-        return create_blank_bar()
+        return patch_blank_bar()
 
     # Get clicked organization details
     clicked_point = click["points"][0]
-    if not clicked_point.get("customdata") or len(clicked_point["customdata"]) < 2:
-        return create_blank_bar("Invalid click data")
-
-    org_name = str(clicked_point["customdata"][1])
-    org_name_sql = org_name.replace("'", "''")  # Escape single quotes for SQL
-
-    # Query organization achievement data
-    org_sql = f"""
-        SELECT 
-            group_description,
-            avg_achievement as achievement,
-            level,
-            organisation_name
-        FROM qof_vis.fct__long_organisation_achievement
-        WHERE organisation_name = '{org_name_sql}'
-        AND reporting_year = {yr}
-        GROUP BY level, group_description, avg_achievement, organisation_name
-        ORDER BY group_description
-    """
-    org_df = query(org_sql)
-
-    # Query national achievement data
-    nat_sql = f"""
-        SELECT 
-            group_description,
-            avg_achievement as achievement,
-            level,
-            organisation_name
-        FROM qof_vis.fct__long_organisation_achievement
-        WHERE level = 'National'
-        AND reporting_year = {yr}
-        GROUP BY level, group_description, avg_achievement, organisation_name
-        ORDER BY group_description
-    """
-    nat_df = query(nat_sql)
+    if not clicked_point.get("id") or not clicked_point.get("text"):
+        return patch_blank_bar("Invalid click data")
+
+    org_code = str(clicked_point["id"])
+    org_name = str(clicked_point["text"])
+
+    # Query organization and national achievement data
+    org_df = get_long_achievement_data(level, org_code, yr)
+    nat_df = get_long_national_achievement_data(yr)
 
     if org_df.is_empty() and nat_df.is_empty():
-        return create_blank_bar(f"No data for {org_name} or National Average in {yr}")
+        return patch_blank_bar(f"No data for {org_name} or National Average in {yr}")
 
     # Prepare and return the visualization
-    return create_bar_chart(prepare_comparison_data(org_df, nat_df), org_name)
+    return patch_bar_chart(prepare_comparison_data(org_df, nat_df), org_name)
 
 
 def prepare_comparison_data(org_df: pl.DataFrame, nat_df: pl.DataFrame) -> pl.DataFrame:
@@ -254,44 +242,90 @@ def prepare_comparison_data(org_df: pl.DataFrame, nat_df: pl.DataFrame) -> pl.Da
         - Achievement: Achievement percentage
         - Source: Organization name or "National Average"
     """
-    # Get sorted groups
-    all_groups = sorted(
-        set(
-            org_df["group_description"].unique().to_list()
-            + nat_df["group_description"].unique().to_list()
-        ),
-        reverse=True,
+    # One row per group from each query, organisation bars first, groups descending
+    org_rows = org_df.sort("group_description", descending=True).select(
+        pl.col("group_description").alias("Group"),
+        pl.col("achievement").alias("Achievement"),
+        pl.col("organisation_name").alias("Source"),
+    )
+    nat_rows = nat_df.sort("group_description", descending=True).select(
+        pl.col("group_description").alias("Group"),
+        pl.col("achievement").alias("Achievement"),
+        pl.lit("National Average").alias("Source"),
     )
+    return pl.concat([org_rows, nat_rows])
+
+
+def create_app(clientside_filtering: bool = CLIENTSIDE_FILTERING) -> dash.Dash:
+    """Create the Dash application and register its callbacks.
+
+    No database work happens here: the connection is opened and the startup
+    data is built lazily, on the first page view or callback. This keeps worker
+    start-up fast.
 
-    # Create plot data structure
-    rows: list[dict[str, str | float | None]] = []
-
-    # Add organization data
-    for group in all_groups:
-        org_rows = org_df.filter(pl.col("group_description") == group)
-        if not org_rows.is_empty():
-            rows.append(
-                {
-                    "Group": group,
-                    "Achievement": org_rows["achievement"][0],
-                    "Source": org_rows["organisation_name"][0],
-                }
-            )
-
-    # Add national average data
-    for group in all_groups:
-        nat_rows = nat_df.filter(pl.col("group_description") == group)
-        if not nat_rows.is_empty():
-            rows.append(
-                {
-                    "Group": group,
-                    "Achievement": nat_rows["achievement"][0],
-                    "Source": "National Average",
-                }
-            )
-
-    return pl.DataFrame(rows)
+    Args:
+        clientside_filtering: Load the whole indicator/year/level slice into the
+            map-data store and apply the bucket in the browser, instead of
+            querying the server on every bucket change.
 
+    Returns:
+        The configured Dash application.
+    """
+    app = dash.Dash(__name__)
+    # A data-free validation layout stops Dash calling serve_layout at assignment
+    app.validation_layout = create_app_layout()
+    app.layout = serve_layout
+
+    app.callback(
+        Output("ind", "options"),
+        Output("ind", "value"),
+        Output("yr", "options"),
+        Output("yr", "value"),
+        Output("bucket", "options"),
+        Output("bucket", "value"),
+        Input("ind", "value"),
+        Input("yr", "value"),
+        Input("level", "value"),
+    )(sync_dropdowns)
+
+    if clientside_filtering:
+        app.callback(
+            Output("map-data", "data"),
+            Output("desc", "children"),
+            Input("ind", "value"),
+            Input("yr", "value"),
+            Input("level", "value"),
+        )(load_map_data)
+
+        app.clientside_callback(
+            ClientsideFunction(namespace="qof", function_name="filter_map"),
+            Output("map", "figure"),
+            Input("map-data", "data"),
+            Input("bucket", "value"),
+        )
+    else:
+        app.callback(
+            Output("map", "figure"),
+            Output("desc", "children"),
+            Input("ind", "value"),
+            Input("yr", "value"),
+            Input("level", "value"),
+            Input("bucket", "value"),
+        )(update_map)
+
+    app.callback(
+        Output("bars", "figure"),
+        Input("map", "clickData"),
+        State("ind", "value"),
+        State("yr", "value"),
+        State("level", "value"),
+    )(update_bars)
+
+    return app
+
+
+app = create_app()
+server = app.server
 
 if __name__ == "__main__":
     app.run(debug=True, use_reloader=False)
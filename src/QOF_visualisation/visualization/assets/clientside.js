@@ -0,0 +1,45 @@
+// Clientside callbacks for the QOF visualization dashboard.
+//
+// filter_map applies the selected achievement bucket to an indicator-year
+// slice held in the "map-data" store (see create_map_store), so changing the
+// bucket needs no round trip to the server.
+
+function decodeTypedArray(spec) {
+    const binary = atob(spec.bdata);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new Float64Array(bytes.buffer);
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    qof: {
+        filter_map: function (store, bucket) {
+            if (!store || !bucket || !(bucket in store.buckets)) {
+                return window.dash_clientside.no_update;
+            }
+
+            const [low, high] = store.buckets[bucket];
+            const lat = decodeTypedArray(store.lat);
+            const lng = decodeTypedArray(store.lng);
+            const pct = decodeTypedArray(store.pct);
+
+            const keep = [];
+            for (let i = 0; i < pct.length; i++) {
+                if ((low === null || pct[i] >= low) && (high === null || pct[i] < high)) {
+                    keep.push(i);
+                }
+            }
+
+            const trace = Object.assign({}, store.figure.data[0], {
+                lat: Float64Array.from(keep, (i) => lat[i]),
+                lon: Float64Array.from(keep, (i) => lng[i]),
+                customdata: Float64Array.from(keep, (i) => pct[i]),
+                ids: keep.map((i) => store.code[i]),
+                text: keep.map((i) => store.name[i]),
+            });
+            return {data: [trace], layout: store.figure.layout};
+        },
+    },
+});
@@ -36,6 +36,18 @@ BUCKET_SQL: Final[dict[str, SQLCondition]] = {
 }
 DEFAULT_BUCKET: Final[str] = "80-100 %"
 
+# Achievement bucket bounds - lower bound inclusive, upper bound exclusive
+BUCKET_RANGE: Final[dict[str, tuple[float, float]]] = {
+    "< 20 %": (float("-inf"), 20),
+    "20-40 %": (20, 40),
+    "40-60 %": (40, 60),
+    "60-80 %": (60, 80),
+    "80-100 %": (80, float("inf")),
+}
+
+# Precomputed row counts per level, indicator, year and bucket (built by dbt)
+BUCKET_OCCUPANCY_TABLE: Final[TableName] = "qof_vis.fct__bucket_occupancy"
+
 # Map settings
 DEFAULT_MAP_CENTER: tuple[float, float] = (54.5, -2)
 DEFAULT_MAP_ZOOM: float = 6.0
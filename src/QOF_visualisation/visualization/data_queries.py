@@ -3,27 +3,38 @@
 This module provides functions for querying achievement data and indicators from
 the QOF database at different organizational levels (practice, PCN, ICB, etc.).
 
+All queries run as named statements with bound parameters. Table names cannot be
+bound, so they are checked against the whitelist in db_connection before being
+substituted into the statement text. The achievement queries that users repeat
+most often are memoized in the shared result cache.
+
 Typical usage example:
     years, indicators = get_available_indicators()
     data = get_achievement_by_org_level(
         level="qof_vis.fct__practice_achievement",
         indic="BP002",
         yr=2024,
-        bucket_condition=">= 80"
+        bucket="80-100 %"
     )
 """
 
-
 import polars as pl
 
-from QOF_visualisation.visualization.db_connection import query
+from QOF_visualisation.visualization.constants import (
+    BUCKET_OCCUPANCY_TABLE,
+    BUCKET_RANGE,
+    BUCKET_SQL,
+)
+from QOF_visualisation.visualization.db_connection import prepared_query, resolve_table
+from QOF_visualisation.visualization.query_cache import memoize
 
 
+@memoize
 def get_achievement_by_org_level(
     level: str,
     indic: str,
     yr: int,
-    bucket_condition: str,
+    bucket: str,
 ) -> pl.DataFrame:
     """Get achievement data for a specific organization level.
 
@@ -31,100 +42,137 @@ def get_achievement_by_org_level(
         level: The organization level table name (e.g., 'qof_vis.fct__practice_achievement')
         indic: The QOF indicator code
         yr: The reporting year
-        bucket_condition: SQL condition defining the achievement bucket (e.g., '>= 80')
+        bucket: The achievement bucket label (a key of BUCKET_RANGE, e.g., '80-100 %')
 
     Returns:
         DataFrame containing organization name, code, achievement percentage,
         description, and geographic coordinates.
     """
+    table = resolve_table(level)
+    low, high = BUCKET_RANGE[bucket]
     q = f"""
-        SELECT 
+        SELECT
             organisation_name,
             organisation_code,
             percentage_patients_achieved AS pct,
             output_description AS descr,
             lat,
             lng
-        FROM {level}
-        WHERE indicator_code = '{indic}'
-        AND reporting_year = {yr}
-        AND percentage_patients_achieved {bucket_condition}
+        FROM {table}
+        WHERE indicator_code = ?
+        AND reporting_year = ?
+        AND percentage_patients_achieved >= ?
+        AND percentage_patients_achieved < ?
     """
-    return query(q)
+    return prepared_query(f"achievement_by_org_level:{table}", q, [indic, yr, low, high])
 
 
-def get_org_achievement_data(
-    table_name: str,
-    org_name: str,
-    yr: int,
-) -> pl.DataFrame:
-    """Get organization achievement data grouped by indicator groups.
+@memoize
+def get_achievement_slice(level: str, indic: str, yr: int) -> pl.DataFrame:
+    """Get achievement data for every bucket of one indicator and year.
+
+    Used by the client-side filtering mode, which ships the whole slice to the
+    browser once and applies the bucket there.
 
     Args:
-        table_name: The organization level table name
-        org_name: The name of the organization to get data for
+        level: The organization level table name (e.g., 'qof_vis.fct__practice_achievement')
+        indic: The QOF indicator code
         yr: The reporting year
 
     Returns:
-        DataFrame containing group descriptions and achievement percentages
-        for the specified organization.
+        DataFrame with the same columns as get_achievement_by_org_level, for
+        every organization with a non-null achievement percentage.
     """
+    table = resolve_table(level)
     q = f"""
-        WITH group_avgs AS (
-            SELECT
-                a.group_code,
-                a.group_description,
-                COUNT(DISTINCT a.indicator_code) as indicators,
-                AVG(CASE WHEN a.percentage_patients_achieved IS NOT NULL 
-                         THEN a.percentage_patients_achieved 
-                         ELSE NULL END) as org_achievement
-            FROM {table_name} a
-            WHERE a.organisation_name = '{org_name}'
-            AND a.reporting_year = {yr}
-            GROUP BY a.group_code, a.group_description
-            HAVING COUNT(DISTINCT a.indicator_code) > 0
-        )
-        SELECT 
+        SELECT
+            organisation_name,
+            organisation_code,
+            percentage_patients_achieved AS pct,
+            output_description AS descr,
+            lat,
+            lng
+        FROM {table}
+        WHERE indicator_code = ?
+        AND reporting_year = ?
+        AND percentage_patients_achieved IS NOT NULL
+    """
+    return prepared_query(f"achievement_slice:{table}", q, [indic, yr])
+
+
+@memoize
+def get_long_achievement_data(level: str, org_code: str, yr: int) -> pl.DataFrame:
+    """Get indicator group achievement for one organisation from the long model.
+
+    The long model holds one row per indicator, so the values are averaged per
+    group. It is sorted on (level, organisation_code, reporting_year), so this
+    is a point lookup that skips all but the matching row groups.
+
+    Args:
+        level: The organization level display name (a key of ORG_TABLE)
+        org_code: The organisation code
+        yr: The reporting year
+
+    Returns:
+        DataFrame with one row per indicator group: group description,
+        achievement, level and organisation name, ordered by group description.
+    """
+    q = """
+        SELECT
             group_description,
-            org_achievement
-        FROM group_avgs
-        ORDER BY group_description DESC
+            AVG(avg_achievement) as achievement,
+            level,
+            organisation_name
+        FROM qof_vis.fct__long_organisation_achievement
+        WHERE level = ?
+        AND organisation_code = ?
+        AND reporting_year = ?
+        GROUP BY group_description, level, organisation_name
+        ORDER BY group_description
     """
-    return query(q)
+    return prepared_query("long_achievement", q, [level, org_code, yr])
 
 
-def get_national_achievement_data(yr: int) -> pl.DataFrame:
-    """Get national achievement averages by indicator groups.
+@memoize
+def get_long_national_achievement_data(yr: int) -> pl.DataFrame:
+    """Get national indicator group achievement from the long model, averaged per group.
 
     Args:
         yr: The reporting year
 
     Returns:
-        DataFrame containing group codes, descriptions, and national achievement
-        percentages averaged across all organizations.
+        DataFrame with one row per indicator group: group description,
+        achievement, level and organisation name, ordered by group description.
     """
-    nat_sql = f"""
-        WITH nat_avgs AS (
-            SELECT
-                n.group_code,
-                n.group_description,
-                COUNT(DISTINCT n.indicator_code) as indicators,
-                AVG(CASE WHEN n.percentage_patients_achieved IS NOT NULL 
-                         THEN n.percentage_patients_achieved 
-                         ELSE NULL END) as nat_achievement
-            FROM qof_vis.fct__national_achievement n
-            WHERE n.reporting_year = {yr}
-            GROUP BY n.group_code, n.group_description
-            HAVING COUNT(DISTINCT n.indicator_code) > 0
-        )
-        SELECT 
-            group_code,
+    q = """
+        SELECT
             group_description,
-            nat_achievement
-        FROM nat_avgs
-        ORDER BY group_description DESC
+            AVG(avg_achievement) as achievement,
+            level,
+            organisation_name
+        FROM qof_vis.fct__long_organisation_achievement
+        WHERE level = 'National'
+        AND reporting_year = ?
+        GROUP BY group_description, level, organisation_name
+        ORDER BY group_description
+    """
+    return prepared_query("long_national_achievement", q, [yr])
+
+
+def get_indicator_year_pairs() -> pl.DataFrame:
+    """Get every indicator code and reporting year combination that has data.
+
+    Returns:
+        DataFrame with one row per distinct (indicator_code, reporting_year) pair.
     """
-    return query(nat_sql)
+    return prepared_query(
+        "available_indicators",
+        """
+        SELECT DISTINCT indicator_code, reporting_year
+        FROM qof_vis.fct__practice_achievement
+        WHERE percentage_patients_achieved IS NOT NULL
+        """,
+    )
 
 
 def get_available_indicators() -> tuple[list[int], list[str]]:
@@ -136,11 +184,7 @@ def get_available_indicators() -> tuple[list[int], list[str]]:
             - A list of available indicator codes
         Both lists are sorted in ascending order.
     """
-    pairs = query("""
-        SELECT DISTINCT indicator_code, reporting_year 
-        FROM qof_vis.fct__practice_achievement 
-        WHERE percentage_patients_achieved IS NOT NULL
-    """)
+    pairs = get_indicator_year_pairs()
 
     years = sorted([int(y) for y in pairs["reporting_year"].unique().to_list()])
     indicators = sorted([str(i) for i in pairs["indicator_code"].unique().to_list()])
@@ -157,37 +201,52 @@ def get_indicators_by_year(yr: int) -> list[str]:
     Returns:
         A sorted list of indicator codes available for the specified year.
     """
-    pairs = query(f"""
+    pairs = prepared_query(
+        "indicators_by_year",
+        """
         SELECT DISTINCT indicator_code
         FROM qof_vis.fct__practice_achievement
-        WHERE reporting_year = {yr}
+        WHERE reporting_year = ?
         AND percentage_patients_achieved IS NOT NULL
-    """)
+        """,
+        [yr],
+    )
     return sorted([str(i) for i in pairs["indicator_code"].unique().to_list()])
 
 
-def check_bucket_has_data(
-    table: str,
+def get_bucket_counts(
+    level: str,
     indic: str,
     yr: int,
-    condition: str,
-) -> bool:
-    """Check if an achievement bucket has any data.
+) -> dict[str, int]:
+    """Get the number of data points in every achievement bucket.
+
+    Counts are read from the precomputed fct__bucket_occupancy model rather than
+    by scanning the achievement tables, so this is a keyed lookup of a few rows.
 
     Args:
-        table: The organization level table name
+        level: The organization level display name (a key of ORG_TABLE)
         indic: The QOF indicator code
         yr: The reporting year
-        condition: SQL condition defining the achievement bucket
 
     Returns:
-        True if the specified bucket contains data points, False otherwise.
+        A dict mapping every bucket label in BUCKET_SQL to its row count.
+        Buckets without data are present with a count of 0.
     """
-    count_df = query(f"""
-        SELECT COUNT(*) as n
-        FROM {table}
-        WHERE indicator_code = '{indic}'
-        AND reporting_year = {yr}
-        AND percentage_patients_achieved {condition}
-    """)
-    return count_df["n"].item() > 0
+    counts_df = prepared_query(
+        "bucket_counts",
+        f"""
+        SELECT bucket, n
+        FROM {BUCKET_OCCUPANCY_TABLE}
+        WHERE level = ?
+        AND indicator_code = ?
+        AND reporting_year = ?
+        """,
+        [level, indic, yr],
+    )
+
+    counts = dict.fromkeys(BUCKET_SQL, 0)
+    for bucket, n in counts_df.iter_rows():
+        if bucket in counts:
+            counts[bucket] = int(n)
+    return counts
@@ -3,12 +3,55 @@
 from __future__ import annotations
 
 import atexit
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
 from pathlib import Path
 from typing import Final
 
 import duckdb
 import polars as pl
 
+from QOF_visualisation.visualization.constants import BUCKET_OCCUPANCY_TABLE, ORG_TABLE
+
+# Tables that may be substituted into named statements
+ALLOWED_TABLES: Final[frozenset[str]] = frozenset(
+    [
+        *ORG_TABLE.values(),
+        BUCKET_OCCUPANCY_TABLE,
+        "qof_vis.fct__national_achievement",
+        "qof_vis.fct__long_organisation_achievement",
+    ]
+)
+
+# Default number of pooled cursors, one per core so concurrent callbacks run in parallel
+DEFAULT_POOL_SIZE: Final[int] = os.cpu_count() or 4
+
+
+@dataclass
+class PoolStats:
+    """Checkout/checkin counters for the connection pool.
+
+    Attributes:
+        checkouts: Number of cursors handed out
+        checkins: Number of cursors returned
+        waits: Number of checkouts that had to wait for a free cursor
+        wait_seconds: Total time spent waiting for a free cursor
+        in_use: Number of cursors currently checked out
+        peak_in_use: Highest number of cursors checked out at once
+    """
+
+    checkouts: int = 0
+    checkins: int = 0
+    waits: int = 0
+    wait_seconds: float = 0.0
+    in_use: int = 0
+    peak_in_use: int = 0
+
 
 class DatabaseConnection:
     """Manages database connection and caching for QOF visualization.
@@ -17,21 +60,45 @@ class DatabaseConnection:
     It sets up an in-memory connection and attaches the specified database file
     in read-only mode.
 
+    Queries run on a bounded pool of cursors over that connection. Each cursor
+    shares the attached database and cached tables but can be used from its own
+    thread, so concurrent callbacks under a threaded server run in parallel
+    instead of racing on one connection.
+
+    Frequently used queries are registered once as named statements and then
+    executed with bound parameters, so values are never spliced into SQL text.
+
+    A retired connection is closed only once every lease and cursor has been
+    returned, so queries already running on it finish normally.
+
     Attributes:
         conn: The DuckDB connection, initialized in memory
     """
 
     conn: duckdb.DuckDBPyConnection  # Type annotation at class level
+    _statements: dict[str, duckdb.Statement]
+    _pool: queue.LifoQueue[duckdb.DuckDBPyConnection]
+    _cursors: list[duckdb.DuckDBPyConnection]
+    _stats: PoolStats
+    _lock: threading.Lock
+    _leases: int
+    _retired: bool
+    _closed: bool
 
-    def __init__(self, db_path: Path) -> None:
+    def __init__(self, db_path: Path, pool_size: int = DEFAULT_POOL_SIZE) -> None:
         """Initialize database connection.
 
         Args:
             db_path: Path to the DuckDB database file
+            pool_size: Number of cursors available to concurrent queries
 
         Raises:
             RuntimeError: If unable to connect to database
+            ValueError: If pool_size is less than 1
         """
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+
         # Connect to in-memory database
         connection = duckdb.connect(":memory:")
         if not connection:
@@ -39,11 +106,23 @@ class DatabaseConnection:
 
         # Store connection and attach database
         self.conn = connection
+        self._statements = {}
         self.conn.execute(f"ATTACH DATABASE '{db_path}' AS qof_vis (READ_ONLY)")
 
         # Create materialized views for frequently used queries
         self._create_materialized_views()
 
+        # Fill the pool once setup is complete so every cursor sees the cached tables
+        self._lock = threading.Lock()
+        self._stats = PoolStats()
+        self._leases = 0
+        self._retired = False
+        self._closed = False
+        self._cursors = [self.conn.cursor() for _ in range(pool_size)]
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        for cursor in self._cursors:
+            self._pool.put_nowait(cursor)
+
         # Register cleanup handler
         atexit.register(self.cleanup)
 
@@ -61,6 +140,77 @@ class DatabaseConnection:
             GROUP BY reporting_year, group_description
         """)
 
+    @contextmanager
+    def checkout(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Borrow a cursor from the pool, blocking until one is free.
+
+        Yields:
+            A DuckDB cursor for the exclusive use of the calling thread
+        """
+        try:
+            cursor = self._pool.get_nowait()
+            waited = None
+        except queue.Empty:
+            start = time.perf_counter()
+            cursor = self._pool.get()
+            waited = time.perf_counter() - start
+
+        with self._lock:
+            self._stats.checkouts += 1
+            self._stats.in_use += 1
+            self._stats.peak_in_use = max(self._stats.peak_in_use, self._stats.in_use)
+            if waited is not None:
+                self._stats.waits += 1
+                self._stats.wait_seconds += waited
+
+        try:
+            yield cursor
+        finally:
+            with self._lock:
+                self._stats.checkins += 1
+                self._stats.in_use -= 1
+            self._pool.put_nowait(cursor)
+            self._close_if_drained()
+
+    def acquire(self) -> bool:
+        """Take a lease that keeps the connection open until release() is called.
+
+        Returns:
+            False if the connection has already been closed.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            self._leases += 1
+            return True
+
+    def release(self) -> None:
+        """Return a lease taken with acquire()."""
+        with self._lock:
+            self._leases -= 1
+        self._close_if_drained()
+
+    def retire(self) -> None:
+        """Close the connection as soon as no lease or cursor is outstanding."""
+        with self._lock:
+            self._retired = True
+        self._close_if_drained()
+
+    def _close_if_drained(self) -> None:
+        """Close a retired connection once its leases and cursors are all back."""
+        with self._lock:
+            if not self._retired or self._closed:
+                return
+            if self._leases or self._stats.in_use:
+                return
+            self._closed = True
+        self.cleanup()
+
+    def pool_stats(self) -> PoolStats:
+        """Return a snapshot of the pool's checkout/checkin counters."""
+        with self._lock:
+            return replace(self._stats)
+
     def query_df(self, sql: str) -> pl.DataFrame:
         """Execute query and return results as a Polars DataFrame.
 
@@ -74,30 +224,171 @@ class DatabaseConnection:
             RuntimeError: If database connection is closed
         """
         # Execute query and get result as Arrow table
-        result = self.conn.execute(sql).fetch_arrow_table()
+        with self.checkout() as cursor:
+            result = cursor.execute(sql).fetch_arrow_table()
 
         # DuckDB's fetch_arrow_table() returns a more predictable type
         # that pl.from_arrow can handle without ambiguity
         return pl.DataFrame(result)
 
+    def prepare(self, name: str, sql: str) -> None:
+        """Register a named statement, parsing it only on first registration.
+
+        Args:
+            name: Unique name for the statement
+            sql: A single SQL statement using ? placeholders for its parameters
+
+        Raises:
+            ValueError: If sql does not contain exactly one statement
+        """
+        if name in self._statements:
+            return
+
+        with self.checkout() as cursor:
+            statements = cursor.extract_statements(sql)
+        if len(statements) != 1:
+            raise ValueError(f"Statement '{name}' must contain exactly one SQL statement")
+        with self._lock:
+            self._statements.setdefault(name, statements[0])
+
+    def execute_prepared(self, name: str, params: Sequence[object] = ()) -> pl.DataFrame:
+        """Execute a registered statement with bound parameters.
+
+        Args:
+            name: Name the statement was registered under
+            params: Values bound to the statement's placeholders, in order
+
+        Returns:
+            A Polars DataFrame containing the query results
+
+        Raises:
+            KeyError: If no statement has been registered under name
+        """
+        statement = self._statements[name]
+        with self.checkout() as cursor:
+            result = cursor.execute(statement, list(params)).fetch_arrow_table()
+        return pl.DataFrame(result)
+
     def cleanup(self) -> None:
-        """Close database connection.
+        """Close pooled cursors and the database connection.
 
         This method is automatically called during program exit
         to clean up database resources.
         """
         try:
+            for cursor in getattr(self, "_cursors", []):
+                cursor.close()
             if hasattr(self, "conn"):
                 self.conn.close()
         except Exception:
             pass  # Ignore errors during cleanup
 
 
-# Global connection instance
+# Global connection instance, opened lazily on first use
 DB_PATH: Final = Path(__file__).parent.parent.parent.parent / "qof_vis.db"
-db = DatabaseConnection(DB_PATH)
+_db: DatabaseConnection | None = None
+_db_pid: int | None = None
+_db_lock = threading.Lock()
+
+
+def get_db() -> DatabaseConnection:
+    """Return the shared connection, opening it on first use.
+
+    The connection is never opened at import time, so importing the dashboards
+    is cheap. It is also reopened in a forked child process (e.g. a gunicorn
+    worker), because DuckDB connections must not be shared across a fork.
+    """
+    global _db, _db_pid
+    pid = os.getpid()
+    if _db is None or _db_pid != pid:
+        with _db_lock:
+            if _db is None or _db_pid != pid:
+                _db = DatabaseConnection(DB_PATH)
+                _db_pid = pid
+    return _db
+
+
+def reset_db() -> None:
+    """Retire the shared connection so that the next get_db() reopens the database.
+
+    Called when the database file has been rebuilt, so that queries stop reading
+    the previously attached file and its cached tables. The old connection is
+    closed once the queries still running on it have finished.
+    """
+    global _db, _db_pid
+    with _db_lock:
+        old, _db, _db_pid = _db, None, None
+    if old is not None:
+        atexit.unregister(old.cleanup)
+        old.retire()
+
+
+@contextmanager
+def shared_db() -> Iterator[DatabaseConnection]:
+    """Lease the shared connection for the duration of the block.
+
+    If the connection is retired and closed between get_db() and the lease, the
+    newly opened one is used instead.
+    """
+    db = get_db()
+    while not db.acquire():
+        db = get_db()
+    try:
+        yield db
+    finally:
+        db.release()
+
+
+def db_fingerprint(db_path: Path = DB_PATH) -> tuple[int, int] | None:
+    """Return the database file's modification time and size, or None if missing.
+
+    Used to detect that the database has been rebuilt since data derived from it
+    was cached.
+    """
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
 
 
 def query(sql: str) -> pl.DataFrame:
     """Global query function that uses the shared connection."""
-    return db.query_df(sql)
+    with shared_db() as db:
+        return db.query_df(sql)
+
+
+def resolve_table(table: str) -> str:
+    """Check a table name against the whitelist of queryable tables.
+
+    Args:
+        table: Fully qualified table name, e.g. a value of ORG_TABLE
+
+    Returns:
+        The table name, unchanged.
+
+    Raises:
+        ValueError: If the table is not in ALLOWED_TABLES
+    """
+    if table not in ALLOWED_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    return table
+
+
+def prepared_query(name: str, sql: str, params: Sequence[object] = ()) -> pl.DataFrame:
+    """Register a named statement on the shared connection and execute it.
+
+    Registration only happens the first time a name is seen, so callers can pass
+    the same name and SQL on every call.
+
+    Args:
+        name: Unique name for the statement
+        sql: A single SQL statement using ? placeholders for its parameters
+        params: Values bound to the statement's placeholders, in order
+
+    Returns:
+        A Polars DataFrame containing the query results
+    """
+    with shared_db() as db:
+        db.prepare(name, sql)
+        return db.execute_prepared(name, params)
@@ -21,6 +21,10 @@ from QOF_visualisation.visualization.constants import (
     DEFAULT_BUCKET,
     ORG_TABLE,
 )
+from QOF_visualisation.visualization.visualization_utils import (
+    create_empty_bar_chart,
+    create_empty_map,
+)
 
 
 def create_header() -> html.H3:
@@ -104,17 +108,20 @@ def create_visualization_area() -> html.Div:
             - Map graph showing organization locations (60% width)
             - Bar chart showing achievement comparisons (38% width)
         The graphs are arranged side by side with a 1% gap between them.
+        Both start with empty traces so callbacks can send partial updates.
     """
     return html.Div(
         [
             dcc.Graph(
                 id="map",
+                figure=create_empty_map(),
                 style={"height": "82vh", "width": "60vw"},
                 config={"scrollZoom": True},
             ),
             html.Div(
                 dcc.Graph(
                     id="bars",
+                    figure=create_empty_bar_chart(),
                     style={"width": "100%", "height": "100%"},
                     config={"scrollZoom": False},
                 ),
@@ -143,6 +150,7 @@ def create_app_layout(default_year: int | None = None, default_ind: str | None =
             2. Control bar with filters
             3. Description area
             4. Main visualization area (map and chart)
+            5. Store for the map data used by client-side filtering
     """
     return html.Div(
         [
@@ -150,6 +158,7 @@ def create_app_layout(default_year: int | None = None, default_ind: str | None =
             create_control_bar(default_year, default_ind),
             create_description(),
             create_visualization_area(),
+            dcc.Store(id="map-data"),
         ],
         style={"padding": 12},
     )
@@ -0,0 +1,196 @@
+"""Result caching for QOF visualization queries.
+
+Different users request the same level, indicator, year and bucket combinations
+over and over. This module keeps recent query results in a bounded LRU cache so
+that repeat views are served from memory instead of DuckDB.
+
+The cache is sized by the estimated memory of the cached DataFrames rather than
+by entry count, and is cleared automatically when the database file changes. The
+shared connection is then reopened, so entries are refilled from the new file.
+
+Typical usage example:
+    @memoize
+    def get_long_national_achievement_data(yr: int) -> pl.DataFrame:
+        ...
+
+    stats = result_cache.stats()
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Final, ParamSpec
+
+import polars as pl
+
+from QOF_visualisation.visualization.db_connection import DB_PATH, db_fingerprint, reset_db
+
+P = ParamSpec("P")
+
+# Default memory budget for cached results
+DEFAULT_CACHE_BYTES: Final[int] = 64 * 1024 * 1024
+
+CacheKey = tuple[Hashable, ...]
+
+
+@dataclass
+class CacheStats:
+    """Counters describing cache effectiveness.
+
+    Attributes:
+        hits: Lookups answered from the cache
+        misses: Lookups that had to run the query
+        evictions: Entries dropped to stay within the memory budget
+        invalidations: Times the cache was cleared because the database changed
+        entries: Number of results currently cached
+        size_bytes: Estimated memory used by cached results
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+
+class QueryCache:
+    """Byte-size-aware LRU cache of query results.
+
+    Results are stored as Polars DataFrames keyed by the query name and its
+    normalized parameters. Each lookup compares the database file's modification
+    time and size against those seen when the entries were stored. If they differ,
+    the cache is cleared and, for the shared database, the connection is reopened.
+    """
+
+    def __init__(self, source: Path, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        """Initialize the cache.
+
+        Args:
+            source: Path to the database file whose changes invalidate the cache
+            max_bytes: Memory budget for cached results
+        """
+        self.source = source
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[CacheKey, tuple[pl.DataFrame, int]] = OrderedDict()
+        self._stats = CacheStats()
+        self._fingerprint = db_fingerprint(self.source)
+        self._lock = threading.Lock()
+
+    def _check_source(self) -> None:
+        """Clear all entries and reopen the database if its file has changed.
+
+        Caller holds the lock.
+        """
+        fingerprint = db_fingerprint(self.source)
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            if self.source == DB_PATH:
+                reset_db()
+            if self._entries:
+                self._entries.clear()
+                self._stats.size_bytes = 0
+                self._stats.entries = 0
+                self._stats.invalidations += 1
+
+    def refresh(self) -> None:
+        """Clear all entries and reopen the database now if its file has changed."""
+        with self._lock:
+            self._check_source()
+
+    def get(self, key: CacheKey) -> pl.DataFrame | None:
+        """Look up a cached result, marking it as recently used.
+
+        Args:
+            key: The normalized cache key
+
+        Returns:
+            The cached DataFrame, or None if not cached.
+        """
+        with self._lock:
+            self._check_source()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry[0]
+
+    def put(self, key: CacheKey, df: pl.DataFrame) -> None:
+        """Store a result, evicting least recently used entries to stay in budget.
+
+        Results larger than the whole budget are not cached.
+
+        Args:
+            key: The normalized cache key
+            df: The query result to cache
+        """
+        size = int(df.estimated_size())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._stats.size_bytes -= old[1]
+
+            while self._entries and self._stats.size_bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._stats.size_bytes -= evicted_size
+                self._stats.evictions += 1
+
+            self._entries[key] = (df, size)
+            self._stats.size_bytes += size
+            self._stats.entries = len(self._entries)
+
+    def clear(self) -> None:
+        """Remove all cached results."""
+        with self._lock:
+            self._entries.clear()
+            self._stats.size_bytes = 0
+            self._stats.entries = 0
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            return CacheStats(**vars(self._stats))
+
+
+# Shared cache for the dashboard queries
+result_cache = QueryCache(DB_PATH)
+
+
+def memoize(fn: Callable[P, pl.DataFrame]) -> Callable[P, pl.DataFrame]:
+    """Cache a query function's results in the shared result cache.
+
+    Arguments are bound to the function's signature with defaults applied, so
+    positional and keyword calls with the same values share one cache entry.
+
+    Args:
+        fn: A query function returning a Polars DataFrame
+
+    Returns:
+        The wrapped function.
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> pl.DataFrame:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key: CacheKey = (fn.__qualname__, *bound.arguments.items())
+
+        df = result_cache.get(key)
+        if df is None:
+            df = fn(*args, **kwargs)
+            result_cache.put(key, df)
+        return df
+
+    return wrapper
@@ -0,0 +1,147 @@
+"""Lazily built startup data for the QOF visualization dashboards.
+
+The dashboards need the available years and indicators, and the indicators for
+each year, before they can render their dropdowns. This module builds that data
+once, on first use, instead of at import time, so that importing a dashboard
+does not touch the database. It is rebuilt when the database file changes, at
+the same time as the query result cache is cleared.
+
+If the QOF_STARTUP_SNAPSHOT environment variable names a file, the data is also
+saved there as JSON together with the database fingerprint. Later processes load
+the snapshot instead of querying, as long as the database has not changed.
+
+Typical usage example:
+    startup = get_startup_data()
+    indicators = startup.codes_by_year.get(2024, [])
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+import polars as pl
+
+from QOF_visualisation.visualization.data_queries import get_indicator_year_pairs
+from QOF_visualisation.visualization.db_connection import DB_PATH, db_fingerprint
+from QOF_visualisation.visualization.query_cache import result_cache
+
+
+class StartupData(NamedTuple):
+    """Years and indicators available in the database.
+
+    Attributes:
+        years: Reporting years, ascending
+        indicators: Indicator codes across all years, ascending
+        codes_by_year: Indicator codes with data for each reporting year, ascending
+    """
+
+    years: list[int]
+    indicators: list[str]
+    codes_by_year: dict[int, list[str]]
+
+    @property
+    def default_year(self) -> int | None:
+        """The most recent reporting year, or None if there is no data."""
+        return self.years[-1] if self.years else None
+
+    @property
+    def default_indicator(self) -> str | None:
+        """The first indicator code, or None if there is no data."""
+        return self.indicators[0] if self.indicators else None
+
+
+_startup: StartupData | None = None
+_startup_fingerprint: tuple[int, int] | None = None
+_startup_lock = threading.Lock()
+
+
+def _snapshot_path() -> Path | None:
+    """Return the configured snapshot path, or None if snapshots are disabled."""
+    env_path = os.getenv("QOF_STARTUP_SNAPSHOT", "")
+    return Path(env_path) if env_path else None
+
+
+def _load_snapshot(path: Path) -> StartupData | None:
+    """Load startup data from a snapshot if it matches the current database."""
+    try:
+        snapshot = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+    fingerprint = db_fingerprint(DB_PATH)
+    if fingerprint is None or snapshot.get("fingerprint") != list(fingerprint):
+        return None
+
+    return StartupData(
+        years=[int(y) for y in snapshot["years"]],
+        indicators=[str(i) for i in snapshot["indicators"]],
+        codes_by_year={int(y): codes for y, codes in snapshot["codes_by_year"].items()},
+    )
+
+
+def _save_snapshot(path: Path, startup: StartupData) -> None:
+    """Write startup data and the current database fingerprint to a snapshot."""
+    fingerprint = db_fingerprint(DB_PATH)
+    if fingerprint is None:
+        return
+
+    snapshot = {
+        "fingerprint": list(fingerprint),
+        "years": startup.years,
+        "indicators": startup.indicators,
+        "codes_by_year": {str(y): codes for y, codes in startup.codes_by_year.items()},
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(snapshot))
+    tmp_path.replace(path)
+
+
+def _query_startup_data() -> StartupData:
+    """Build startup data from a single scan of indicator/year pairs."""
+    pairs = get_indicator_year_pairs()
+
+    years = sorted(int(y) for y in pairs["reporting_year"].unique().to_list())
+    indicators = sorted(str(i) for i in pairs["indicator_code"].unique().to_list())
+    codes_by_year = {
+        year: sorted(
+            pairs.filter(pl.col("reporting_year") == year)["indicator_code"]
+            .cast(str)
+            .unique()
+            .to_list()
+        )
+        for year in years
+    }
+    return StartupData(years, indicators, codes_by_year)
+
+
+def get_startup_data() -> StartupData:
+    """Return the startup data, building it on first call.
+
+    The data is rebuilt if the database file has changed since it was built.
+    Thread-safe; concurrent first callers wait for a single build. Separate
+    worker processes each build their own copy, or load it from the snapshot.
+
+    Returns:
+        The years and indicators available in the database.
+    """
+    global _startup, _startup_fingerprint
+    fingerprint = db_fingerprint(DB_PATH)
+    if _startup is None or fingerprint != _startup_fingerprint:
+        with _startup_lock:
+            if _startup is None or fingerprint != _startup_fingerprint:
+                # Reopen the connection first if the file changed under the query cache
+                result_cache.refresh()
+                path = _snapshot_path()
+                startup = _load_snapshot(path) if path else None
+                if startup is None:
+                    startup = _query_startup_data()
+                    if path:
+                        _save_snapshot(path, startup)
+                _startup = startup
+                _startup_fingerprint = fingerprint
+    return _startup
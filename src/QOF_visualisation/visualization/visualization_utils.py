@@ -18,10 +18,20 @@ Typical usage example:
         org_name="Example Practice",
         title="QOF Achievement Comparison"
     )
+
+    # Update an existing map or bar chart in place
+    patch = patch_map(achievement_data)
+    patch = patch_bar_chart(comparison_data, org_name="Example Practice")
 """
 
+import base64
+from typing import Any
+
 import plotly.graph_objects as go
 import polars as pl
+from dash import Patch
+
+from QOF_visualisation.visualization.constants import BUCKET_RANGE
 
 
 def create_map(
@@ -32,8 +42,14 @@ def create_map(
 ) -> go.Figure:
     """Create a map visualization with practice/organization markers.
 
+    Numeric columns are passed to Plotly as NumPy arrays, which it serializes as
+    base64 typed arrays rather than JSON lists. Hover labels are built in the
+    browser from a hovertemplate, so the only per-point strings sent are the
+    organisation names.
+
     Args:
-        df: DataFrame containing lat, lng, organisation_name, and pct columns.
+        df: DataFrame containing lat, lng, organisation_code, organisation_name,
+            and pct columns.
         center_lat: Latitude for the center of the map (default: 54.5).
         center_lon: Longitude for the center of the map (default: -2).
         zoom: Initial zoom level for the map (default: 6.0).
@@ -42,29 +58,25 @@ def create_map(
         A Plotly Figure object containing the map visualization.
 
     The map shows organization locations with markers that display
-    the name and achievement percentage on hover.
+    the name and achievement percentage on hover. Clicked points carry the
+    organisation code in id, the name in text and the achievement percentage
+    in customdata.
     """
     fig = go.Figure(
         data=[
             go.Scattermap(
-                lat=df["lat"].to_list(),
-                lon=df["lng"].to_list(),
+                lat=df["lat"].cast(pl.Float64).to_numpy(),
+                lon=df["lng"].cast(pl.Float64).to_numpy(),
                 mode="markers",
                 marker=dict(
                     size=6,
                     color="#1f77b4",
                     opacity=0.95,
                 ),
-                hoverinfo="text",
-                text=[
-                    f"<b>{name}</b><br>{pct:.1f}%"
-                    for name, pct in zip(
-                        df["organisation_name"].to_list(), df["pct"].to_list(), strict=True
-                    )
-                ],
-                customdata=list(
-                    zip(df["pct"].to_list(), df["organisation_name"].to_list(), strict=True)
-                ),
+                ids=df["organisation_code"].to_numpy(),
+                text=df["organisation_name"].to_numpy(),
+                customdata=df["pct"].cast(pl.Float64).to_numpy(),
+                hovertemplate="<b>%{text}</b><br>%{customdata:.1f}%<extra></extra>",
             )
         ]
     )
@@ -83,6 +95,87 @@ def create_map(
     return fig
 
 
+def create_empty_map() -> go.Figure:
+    """Create a map with one empty marker trace, for patch_map to fill in."""
+    return create_map(
+        pl.DataFrame(
+            schema={
+                "lat": pl.Float64,
+                "lng": pl.Float64,
+                "organisation_code": pl.String,
+                "organisation_name": pl.String,
+                "pct": pl.Float64,
+            }
+        )
+    )
+
+
+def patch_map(df: pl.DataFrame) -> Patch:
+    """Replace the marker data of a map built by create_map or create_empty_map.
+
+    Only the trace arrays are sent, with the numeric ones as base64 typed
+    arrays; the layout, tile style and view are left as they are in the browser.
+
+    Args:
+        df: DataFrame containing lat, lng, organisation_code, organisation_name,
+            and pct columns.
+
+    Returns:
+        A dash Patch for the map figure.
+    """
+    patch = Patch()
+    patch["data"][0]["lat"] = _typed_array(df["lat"])
+    patch["data"][0]["lon"] = _typed_array(df["lng"])
+    patch["data"][0]["ids"] = df["organisation_code"].to_list()
+    patch["data"][0]["text"] = df["organisation_name"].to_list()
+    patch["data"][0]["customdata"] = _typed_array(df["pct"])
+    return patch
+
+
+def patch_blank_map() -> Patch:
+    """Remove all markers from a map built by create_map or create_empty_map."""
+    patch = Patch()
+    for key in ("lat", "lon", "ids", "text", "customdata"):
+        patch["data"][0][key] = []
+    return patch
+
+
+def _typed_array(series: pl.Series) -> dict[str, str]:
+    """Encode a numeric column in Plotly's base64 typed-array form."""
+    data = series.cast(pl.Float64).to_numpy().astype("<f8")
+    return {"dtype": "f8", "bdata": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def create_map_store(df: pl.DataFrame) -> dict[str, Any]:
+    """Pack one indicator-year slice for the client-side bucket filter.
+
+    The store holds the achievement columns in columnar form, the numeric ones
+    as base64 typed arrays, together with an empty create_map figure for the
+    browser to fill in and the bucket bounds to filter by. Unbounded bucket
+    edges are sent as null.
+
+    Args:
+        df: DataFrame containing lat, lng, organisation_code, organisation_name,
+            and pct columns.
+
+    Returns:
+        A JSON-serializable dict for a dcc.Store, read by the filter_map
+        clientside callback.
+    """
+    return {
+        "figure": create_map(df.clear()).to_plotly_json(),
+        "lat": _typed_array(df["lat"]),
+        "lng": _typed_array(df["lng"]),
+        "pct": _typed_array(df["pct"]),
+        "code": df["organisation_code"].to_list(),
+        "name": df["organisation_name"].to_list(),
+        "buckets": {
+            label: [None if abs(b) == float("inf") else b for b in bounds]
+            for label, bounds in BUCKET_RANGE.items()
+        },
+    }
+
+
 def create_bar_chart(
     df: pl.DataFrame,
     org_name: str,
@@ -180,6 +273,67 @@ def create_bar_chart(
     return bar_fig
 
 
+def create_empty_bar_chart(msg: str = "Click a point") -> go.Figure:
+    """Create a bar chart with empty traces and a message, for patching.
+
+    The figure has the same structure as create_bar_chart, so later updates
+    can be sent with patch_bar_chart and patch_blank_bar.
+
+    Args:
+        msg: Message shown as the chart title.
+
+    Returns:
+        A Plotly Figure object with empty organization and national traces.
+    """
+    empty = pl.DataFrame(
+        schema={"Group": pl.String, "Achievement": pl.Float64, "Source": pl.String}
+    )
+    fig = create_bar_chart(empty, org_name="", title=msg)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def patch_bar_chart(
+    df: pl.DataFrame,
+    org_name: str,
+    title: str | None = None,
+) -> Patch:
+    """Replace the bars and title of a chart built by create_bar_chart.
+
+    Args:
+        df: DataFrame containing Source, Achievement, and Group columns.
+        org_name: Name of the organization being compared.
+        title: Optional custom title for the chart.
+            If None, defaults to "Performance Comparison - {org_name}".
+
+    Returns:
+        A dash Patch for the bar chart figure.
+    """
+    org_rows = df.filter(pl.col("Source") == org_name)
+    nat_rows = df.filter(pl.col("Source") == "National Average")
+
+    patch = Patch()
+    patch["data"][0]["x"] = org_rows["Achievement"].to_list()
+    patch["data"][0]["y"] = org_rows["Group"].to_list()
+    patch["data"][0]["name"] = org_name
+    patch["data"][1]["x"] = nat_rows["Achievement"].to_list()
+    patch["data"][1]["y"] = nat_rows["Group"].to_list()
+    patch["layout"]["title"]["text"] = title or f"Performance Comparison - {org_name}"
+    patch["layout"]["showlegend"] = True
+    return patch
+
+
+def patch_blank_bar(msg: str = "Click a point") -> Patch:
+    """Clear the bars of a chart built by create_bar_chart and show a message."""
+    patch = Patch()
+    for trace in range(2):
+        patch["data"][trace]["x"] = []
+        patch["data"][trace]["y"] = []
+    patch["layout"]["title"]["text"] = msg
+    patch["layout"]["showlegend"] = False
+    return patch
+
+
 def create_blank_map(
     center_lat: float = 53,
     center_lon: float = -1.5,
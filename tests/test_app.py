@@ -0,0 +1,39 @@
+import polars as pl
+
+from QOF_visualisation.visualization.app import prepare_comparison_data
+
+
+def long_rows(groups: list[str], values: list[float], name: str) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "group_description": groups,
+            "achievement": values,
+            "level": ["Practice"] * len(groups),
+            "organisation_name": [name] * len(groups),
+        },
+        schema={
+            "group_description": pl.String,
+            "achievement": pl.Float64,
+            "level": pl.String,
+            "organisation_name": pl.String,
+        },
+    )
+
+
+def test_one_bar_per_group_and_source():
+    org = long_rows(["Asthma", "Diabetes"], [70.0, 50.0], "Leeds Surgery")
+    nat = long_rows(["Asthma", "Cancer"], [65.0, 40.0], "National Average")
+
+    assert prepare_comparison_data(org, nat).rows() == [
+        ("Diabetes", 50.0, "Leeds Surgery"),
+        ("Asthma", 70.0, "Leeds Surgery"),
+        ("Cancer", 40.0, "National Average"),
+        ("Asthma", 65.0, "National Average"),
+    ]
+
+
+def test_missing_organisation_data_keeps_national_bars():
+    org = long_rows([], [], "Leeds Surgery")
+    nat = long_rows(["Asthma"], [65.0], "National Average")
+
+    assert prepare_comparison_data(org, nat).rows() == [("Asthma", 65.0, "National Average")]
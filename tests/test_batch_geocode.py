@@ -0,0 +1,79 @@
+import asyncio
+from pathlib import Path
+
+from QOF_visualisation.batch_geocode import batch_geocode, geocode_practices
+from QOF_visualisation.coord_dataclasses import PracticeAdd, PracticeCoords
+from QOF_visualisation.geocode_stub import GeocodeStubServer, StubConfig, canned_location
+
+
+def write_lookup(tmp_path: Path) -> Path:
+    lookup = tmp_path / "postcodes.csv"
+    lookup.write_text("postcode,latitude,longitude\nLS1 4AP,53.8,-1.55\n")
+    return lookup
+
+
+def test_postcode_lookup_then_stub_for_unmatched(tmp_path: Path):
+    practices = [
+        PracticeAdd("A", "Leeds Surgery, LS1 4AP", "Leeds Surgery, 1 high st, LS1 4AP"),
+        PracticeAdd("B", "York Surgery, YO1 7HH", "York Surgery, 2 low st, YO1 7HH"),
+    ]
+    with GeocodeStubServer(StubConfig(latency=0.0, seed=0)) as server:
+        located, failed = batch_geocode(
+            practices,
+            "",
+            postcode_lookup=write_lookup(tmp_path),
+            geocoder=server.geocoder(),
+        )
+    assert failed == []
+    assert PracticeCoords("A", 53.8, -1.55) in located
+    assert PracticeCoords("B", *canned_location("York Surgery, YO1 7HH")) in located
+    assert server.stats().requests == 1
+
+
+def test_stub_failures_get_a_second_pass(tmp_path: Path):
+    practices = [
+        PracticeAdd(f"P{i}", f"Surgery {i}, AB1 2CD", f"Surgery {i}, x") for i in range(20)
+    ]
+    config = StubConfig(latency=0.0, not_found_rate=0.5, seed=1)
+    with GeocodeStubServer(config) as server:
+        located, failed = batch_geocode(
+            practices, "", cache_path=tmp_path / "cache.parquet", geocoder=server.geocoder()
+        )
+    assert len(located) + len(failed) == len(practices)
+    assert len({c.practice_code for c in located}) == len(located)
+    assert (tmp_path / "cache.parquet").exists()
+
+
+def test_second_run_is_served_from_the_cache(tmp_path: Path):
+    practices = [PracticeAdd(f"P{i}", f"Surgery {i}, AB1 2CD", f"Surgery {i}, x") for i in range(5)]
+    cache_path = tmp_path / "cache.parquet"
+    with GeocodeStubServer(StubConfig(latency=0.0, seed=2)) as server:
+        first, _ = batch_geocode(practices, "", cache_path=cache_path, geocoder=server.geocoder())
+        requests = server.stats().requests
+        second, failed = batch_geocode(
+            practices, "", cache_path=cache_path, geocoder=server.geocoder()
+        )
+    assert failed == []
+    assert sorted(second) == sorted(first)
+    assert server.stats().requests == requests
+
+
+def test_quota_errors_are_retried(tmp_path: Path):
+    practices = [PracticeAdd(f"P{i}", f"Surgery {i}, AB1 2CD", f"Surgery {i}, x") for i in range(5)]
+    with GeocodeStubServer(StubConfig(latency=0.0, quota_rate=0.3, seed=3)) as server:
+        located, failed = batch_geocode(practices, "", geocoder=server.geocoder())
+    assert failed == []
+    assert len(located) == len(practices)
+    assert server.stats().over_query_limit > 0
+
+
+def test_without_a_geocoder_unmatched_practices_fail(tmp_path: Path):
+    practices = [
+        PracticeAdd("A", "Leeds Surgery, LS1 4AP", "Leeds Surgery, 1 high st, LS1 4AP"),
+        PracticeAdd("B", "York Surgery, YO1 7HH", "York Surgery, 2 low st, YO1 7HH"),
+    ]
+    located, failed = asyncio.run(
+        geocode_practices(practices, "", postcode_lookup=write_lookup(tmp_path))
+    )
+    assert located == [PracticeCoords("A", 53.8, -1.55)]
+    assert failed == [practices[1]]
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from QOF_visualisation.visualization.db_connection import DatabaseConnection
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    path = tmp_path / "qof_vis.db"
+    with duckdb.connect(str(path)) as conn:
+        conn.execute("""
+            create table fct__national_achievement as
+            select 2024 as reporting_year, 'Asthma' as group_description,
+                80.0 as percentage_patients_achieved
+        """)
+    return path
+
+
+def test_retire_waits_for_outstanding_leases(db_path: Path):
+    db = DatabaseConnection(db_path, pool_size=2)
+    assert db.acquire()
+    db.retire()
+
+    assert db.query_df("select 1 as x")["x"].to_list() == [1]
+    db.release()
+    assert not db.acquire()
+    with pytest.raises(duckdb.ConnectionException):
+        db.conn.execute("select 1")
+
+
+def test_retire_waits_for_checked_out_cursors(db_path: Path):
+    db = DatabaseConnection(db_path, pool_size=2)
+    with db.checkout() as cursor:
+        db.retire()
+        assert cursor.execute("select count(*) from national_averages").fetchone() == (1,)
+    assert not db.acquire()
+
+
+def test_retire_closes_an_idle_connection(db_path: Path):
+    db = DatabaseConnection(db_path, pool_size=1)
+    db.retire()
+    assert not db.acquire()
+    db.cleanup()
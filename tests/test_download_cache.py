@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from QOF_visualisation.download_cache import CacheEntry, DownloadCache
+
+URL = "https://example.com/QOF2324.zip"
+
+
+def test_round_trip(tmp_path: Path):
+    path = tmp_path / "cache.json"
+    cache = DownloadCache(path)
+    entry = CacheEntry(etag='"abc"', last_modified="Tue, 01 Oct 2024 00:00:00 GMT", sha256="00ff")
+    assert cache.record(URL, entry)
+    cache.save()
+
+    reloaded = DownloadCache(path)
+    assert reloaded.get(URL) == entry
+    assert reloaded.conditional_headers(URL) == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Tue, 01 Oct 2024 00:00:00 GMT",
+    }
+
+
+def test_record_reports_changed_content(tmp_path: Path):
+    cache = DownloadCache(tmp_path / "cache.json")
+    assert cache.record(URL, CacheEntry(None, None, "00ff"))
+    assert not cache.record(URL, CacheEntry('"new"', None, "00ff"))
+    assert cache.record(URL, CacheEntry(None, None, "ff00"))
+
+
+def test_forget(tmp_path: Path):
+    cache = DownloadCache(tmp_path / "cache.json")
+    cache.record(URL, CacheEntry('"abc"', None, "00ff"))
+    cache.forget(URL)
+    assert cache.get(URL) is None
+    assert cache.conditional_headers(URL) == {}
+    assert cache.record(URL, CacheEntry('"abc"', None, "00ff"))
+    cache.forget("https://example.com/unknown.zip")
+
+
+def test_unreadable_file_is_ignored(tmp_path: Path):
+    path = tmp_path / "cache.json"
+    path.write_text("{not json")
+    assert DownloadCache(path).get(URL) is None
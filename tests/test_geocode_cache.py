@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from QOF_visualisation import geocode_cache
+from QOF_visualisation.geocode_cache import GeocodeCache, address_key, normalize_address
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1_000_000.0]
+    monkeypatch.setattr(geocode_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_normalize_address():
+    assert (
+        normalize_address("  The Surgery ,High  St,, LS1 4AP ") == "the surgery, high st, ls1 4ap"
+    )
+    assert address_key("The Surgery, LS1 4AP") == address_key("the surgery ,  ls1 4ap")
+
+
+def test_found_and_not_found_expire_separately(tmp_path: Path, clock: list[float]):
+    cache = GeocodeCache(tmp_path / "cache.parquet", found_ttl=100, not_found_ttl=10)
+    cache.record("found", 53.8, -1.55)
+    cache.record("missing", None, None)
+
+    found, missing = cache.get("found"), cache.get("missing")
+    assert found is not None and found.found
+    assert missing is not None and not missing.found
+
+    clock[0] += 50
+    assert cache.get("found") is not None
+    assert cache.get("missing") is None
+
+    clock[0] += 100
+    assert cache.get("found") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_save_round_trip_drops_expired(tmp_path: Path, clock: list[float]):
+    path = tmp_path / "cache.parquet"
+    cache = GeocodeCache(path, found_ttl=100, not_found_ttl=10)
+    cache.record("old", None, None)
+    clock[0] += 50
+    cache.record("found", 53.8, -1.55)
+    cache.record("missing", None, None)
+    cache.save()
+
+    reloaded = GeocodeCache(path, found_ttl=100, not_found_ttl=10)
+    found = reloaded.get("found")
+    assert found is not None and (found.lat, found.lng) == (53.8, -1.55)
+    missing = reloaded.get("missing")
+    assert missing is not None and not missing.found
+    assert reloaded.get("old") is None
+    assert not path.with_suffix(".parquet.tmp").exists()
+
+
+def test_unreadable_file_is_ignored(tmp_path: Path):
+    path = tmp_path / "cache.parquet"
+    path.write_text("not parquet")
+    assert GeocodeCache(path).get("anything") is None
@@ -0,0 +1,39 @@
+import io
+import zipfile
+from pathlib import Path
+
+from QOF_visualisation.get_sources import extract_matching
+
+
+def make_zip(names: list[str]) -> zipfile.ZipFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        for name in names:
+            z.writestr(name, f"contents of {name}")
+    return zipfile.ZipFile(buffer)
+
+
+def test_txt_members_are_renamed_and_matched_as_csv(tmp_path: Path):
+    z = make_zip(["ACHIEVEMENT_2324.txt", "readme.txt", "data/MAPPING_2324.csv"])
+    extracted = extract_matching(z, tmp_path, ["ACHIEVEMENT*.csv", "MAPPING*"])
+
+    assert extracted == [tmp_path / "ACHIEVEMENT_2324.csv", tmp_path / "data" / "MAPPING_2324.csv"]
+    assert (tmp_path / "ACHIEVEMENT_2324.csv").read_text() == "contents of ACHIEVEMENT_2324.txt"
+    assert not (tmp_path / "ACHIEVEMENT_2324.txt").exists()
+    assert not (tmp_path / "readme.csv").exists()
+
+
+def test_unsafe_paths_are_skipped(tmp_path: Path):
+    target = tmp_path / "target"
+    target.mkdir()
+    z = make_zip(["../escape.csv", "/abs/escape.csv", "nested/../../escape.csv", "ok.csv"])
+    extracted = extract_matching(z, target, ["*.csv"])
+
+    assert extracted == [target / "ok.csv"]
+    assert not (tmp_path / "escape.csv").exists()
+    assert not list(tmp_path.rglob("escape.csv"))
+
+
+def test_directories_are_skipped(tmp_path: Path):
+    z = make_zip(["folder/", "folder/a.csv"])
+    assert extract_matching(z, tmp_path, ["*"]) == [tmp_path / "folder" / "a.csv"]
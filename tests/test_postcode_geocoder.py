@@ -0,0 +1,21 @@
+import pytest
+
+from QOF_visualisation.postcode_geocoder import extract_postcode
+
+
+@pytest.mark.parametrize(
+    ("address", "postcode"),
+    [
+        ("Leeds Surgery, LS1 4AP", "LS1 4AP"),
+        ("Leeds Surgery, ls14ap", "LS1 4AP"),
+        ("Leeds Surgery, LS1 4AP  ", "LS1 4AP"),
+        ("Palace Surgery, SW1A 1AA", "SW1A 1AA"),
+        ("Town Surgery, W1 1AA", "W1 1AA"),
+        ("Town Surgery, M60 1NW", "M60 1NW"),
+        ("Leeds Surgery, LS1 4AP, UK", None),
+        ("Leeds Surgery", None),
+        ("", None),
+    ],
+)
+def test_extract_postcode(address: str, postcode: str | None):
+    assert extract_postcode(address) == postcode
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import polars as pl
+
+from QOF_visualisation.visualization.query_cache import QueryCache
+
+
+def frame(n: int) -> pl.DataFrame:
+    return pl.DataFrame({"value": list(range(n))})
+
+
+def test_evicts_least_recently_used_to_stay_in_budget(tmp_path: Path):
+    size = int(frame(100).estimated_size())
+    cache = QueryCache(tmp_path / "missing.db", max_bytes=2 * size)
+    cache.put(("a",), frame(100))
+    cache.put(("b",), frame(100))
+    assert cache.get(("a",)) is not None
+
+    cache.put(("c",), frame(100))
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None
+    assert cache.get(("c",)) is not None
+
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.entries == 2
+    assert stats.size_bytes == 2 * size
+
+
+def test_result_larger_than_budget_is_not_cached(tmp_path: Path):
+    cache = QueryCache(tmp_path / "missing.db", max_bytes=int(frame(10).estimated_size()))
+    cache.put(("big",), frame(1000))
+    assert cache.get(("big",)) is None
+    assert cache.stats().size_bytes == 0
+
+
+def test_replacing_a_key_keeps_the_size_accurate(tmp_path: Path):
+    cache = QueryCache(tmp_path / "missing.db")
+    cache.put(("a",), frame(100))
+    cache.put(("a",), frame(10))
+    assert cache.stats().size_bytes == int(frame(10).estimated_size())
+
+
+def test_cleared_when_the_source_file_changes(tmp_path: Path):
+    source = tmp_path / "data.db"
+    source.write_bytes(b"v1")
+    cache = QueryCache(source)
+    cache.put(("a",), frame(10))
+    assert cache.get(("a",)) is not None
+
+    source.write_bytes(b"version 2")
+    assert cache.get(("a",)) is None
+    stats = cache.stats()
+    assert stats.invalidations == 1
+    assert stats.entries == 0
+    assert stats.size_bytes == 0
+
+    cache.put(("a",), frame(10))
+    assert cache.get(("a",)) is not None
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from QOF_visualisation.geocoders import OK, OVER_QUERY_LIMIT
+from QOF_visualisation.rate_limit import BACKOFF_CAP, AdaptiveLimiter, TokenBucket, backoff_delay
+
+
+async def finish(limiter: AdaptiveLimiter, status: str) -> None:
+    async with limiter.slot() as slot:
+        slot.status = status
+
+
+def test_token_bucket_limits_the_rate():
+    async def acquire_all(bucket: TokenBucket, n: int) -> float:
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # One token is available at once, the other ten arrive at 100 per second
+    elapsed = asyncio.run(acquire_all(TokenBucket(rate=100, capacity=1), 11))
+    assert elapsed >= 0.09
+
+
+def test_success_grows_the_limit_additively():
+    limiter = AdaptiveLimiter(rate=1000, max_concurrent=4, initial_concurrent=2)
+    asyncio.run(finish(limiter, OK))
+    assert limiter.limit == pytest.approx(2.5)
+
+    for _ in range(20):
+        asyncio.run(finish(limiter, OK))
+    assert limiter.limit == 4
+
+
+def test_quota_error_halves_the_limit():
+    limiter = AdaptiveLimiter(rate=1000, max_concurrent=16, min_concurrent=2, initial_concurrent=8)
+    asyncio.run(finish(limiter, OVER_QUERY_LIMIT))
+    assert limiter.limit == 4
+
+    stats = limiter.stats()
+    assert (stats.requests, stats.quota_errors, stats.decreases) == (1, 1, 1)
+
+    for _ in range(3):
+        time.sleep(0.01)
+        asyncio.run(finish(limiter, OVER_QUERY_LIMIT))
+    assert limiter.limit == 2
+
+
+def test_concurrency_never_exceeds_the_limit():
+    limiter = AdaptiveLimiter(rate=1000, max_concurrent=3, initial_concurrent=3)
+    in_flight, peak = 0, 0
+
+    async def request() -> None:
+        nonlocal in_flight, peak
+        async with limiter.slot() as slot:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            slot.status = OK
+
+    async def run() -> None:
+        await asyncio.gather(*(request() for _ in range(12)))
+
+    asyncio.run(run())
+    assert peak <= 3
+
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt) <= BACKOFF_CAP for attempt in range(20))
+    assert all(backoff_delay(30, OVER_QUERY_LIMIT) <= BACKOFF_CAP for _ in range(20))